@@ -1,20 +1,51 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file
-from database import db, Student, Attendance, Timetable, Command
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context
+from database import db, Student, Attendance, Timetable
+from timetable_index import timetable_index
+from presence import record_presence, active_student_count, students_in_lab, rebuild_presence
+from student_cache import student_cache
+from migrations import upgrade_schema, check_query_plans
+from events import event_broker
+from state_store import create_state_store
+from devices import DeviceRegistry, DEFAULT_DEVICE, heartbeat_is_fresh
+from commands import queue_command, queue_for_devices, claim_next, acknowledge, command_payload, command_notifier
+from attendance_engine import decide
+from rollups import record_logs, subtract_student, move_student, rebuild_rollups, daily_counts, semester_counts
+from export import attendance_export_query, stream_csv, build_xlsx_file, stream_file_and_remove
+from sessions import session_cache, session_hours, filter_sessions, iter_sessions_for_export, parse_day, first_log_day
+from attendance_report import report_cache
+from enrollment import EnrollmentSession
+import reconcile
+import archive
+from purge import PurgeJob
+from roster import import_roster, RosterFormatError, roster_query, stream_roster_csv, build_roster_xlsx
+from metrics import metrics, PhaseTimer, scan_phase_seconds, scans_total, request_seconds, bridge_round_trip_seconds
 from datetime import datetime, date, timedelta
 import os
-import calendar
-import pandas as pd
 import time
-import io
+import json
+import logging
+import click
+
+# LOG_LEVEL=DEBUG shows the per-scan class lookups; the default INFO skips them
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///attendance.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///attendance.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Each server thread holds one connection while it handles a request; size the
+# pool to the server's thread count (serve.py) so requests don't queue for one
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///:memory:'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 16)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 8)),
+        'pool_timeout': 10,
+    }
 
 
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user, UserMixin
-from database import db, Student, Attendance, Timetable, Command, Admin
-from flask import flash
+from flask_login import LoginManager, login_user, login_required, logout_user
+from database import db, Student, Attendance, Timetable, Admin, StudentPresence, ScanReceipt, AttendanceRollup
+from flask import flash, g
 
 # ... (Previous imports)
 
@@ -30,32 +61,124 @@ def load_user(user_id):
     return Admin.query.get(int(user_id))
 
 
-# Global State for Registration/Commands
-command_queue = []
-registration_status = {'status': 'idle', 'message': '', 'fingerprint_id': None}
-manual_class_status = {'active': False, 'subject': None, 'semester': 'All'} # Global Manual Override
-lcd_message = "Initializing..."
-last_heartbeat_time = 0
+# Global State for Registration/Device/Manual Session
+# Lives in a state store so several worker processes can share it
+# (STATE_BACKEND=sqlite); the default keeps it in this process.
+state = create_state_store(path=os.environ.get('STATE_DB_PATH', os.path.join(app.instance_path, 'app_state.db')))
+# Heartbeat / LCD / registration per scanner (one bridge can drive several)
+devices = DeviceRegistry(state)
+# Batched enrollment of many students, one REGISTER after another
+enrollment = EnrollmentSession(state)
+purge_job = PurgeJob(state)
+# The caches live in each worker; with a shared store their invalidations reach every worker
+for cache in (student_cache, timetable_index, session_cache, report_cache):
+    cache.generation.bind(state)
+
+def is_device_connected():
+    """True while any scanner is sending heartbeats."""
+    return devices.any_connected()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None and request.endpoint:
+        request_seconds.observe(time.perf_counter() - started, endpoint=request.endpoint)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.context_processor
 def inject_device_status():
-    is_connected = (time.time() - last_heartbeat_time) < 5
-    return dict(is_device_connected=is_connected, manual_class=manual_class_status)
+    return dict(is_device_connected=is_device_connected(), manual_class=state.get('manual_class_status'))
 
 @app.route('/api/heartbeat', methods=['POST'])
 def heartbeat():
-    global last_heartbeat_time
-    last_heartbeat_time = time.time()
+    # Body: {"device_id", "lab_name"} or {"devices": [{"device_id", "lab_name"}, ...]}
+    # for a bridge driving several scanners (empty body: the single legacy device).
+    # "round_trips" carries the bridge's scan round-trip times (seconds) since the last beat.
+    data = request.get_json(silent=True) or {}
+    reported = data.get('devices') or [data]
+    was_connected = devices.any_connected()
+    for device in reported:
+        device_id = device.get('device_id') or DEFAULT_DEVICE
+        if devices.heartbeat(device_id, device.get('lab_name')):
+            event_broker.publish('device', {'connected': True, 'device_id': device_id})
+        for seconds in device.get('round_trips') or []:
+            if isinstance(seconds, (int, float)):
+                bridge_round_trip_seconds.observe(seconds, device_id=device_id)
+    if not was_connected and reported:
+        logger.info("Device online: %s", ', '.join(d.get('device_id') or DEFAULT_DEVICE for d in reported))
     return jsonify({'status': 'ok'})
 
-def get_current_class(student_semester):
-    """Checks the timetable for a class currently running for a specific semester."""
+@app.route('/api/devices')
+def api_devices():
+    """Every scanner seen so far with its lab, connection, LCD text and registration state."""
+    return jsonify({'devices': devices.describe()})
+
+def watched_state():
+    """State an event stream polls, so changes made by other workers still reach it."""
+    values = state.get_many(['last_heartbeat_time', 'lcd_message', 'last_log_id'])
+    return {
+        'device': {'connected': heartbeat_is_fresh(values['last_heartbeat_time'])},
+        'lcd': {'message': values['lcd_message']},
+        'attendance': {'last_id': values['last_log_id']},
+    }
+
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events stream: 'lcd', 'attendance' and 'device' updates.
+
+    503 once SSE_MAX_STREAMS streams are open; the pages then poll instead.
+    """
+    q = event_broker.subscribe()
+    if q is None:
+        return jsonify({'status': 'error', 'message': 'Too many live streams open, poll instead'}), 503, {'Retry-After': '30'}
+    current = watched_state()
+    initial = [
+        ('device', current['device']),
+        ('lcd', current['lcd']),
+    ]
+    response = Response(
+        event_broker.stream(q, initial, watched_state),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also frees the slot if the client left before the stream started
+    response.call_on_close(lambda: event_broker.unsubscribe(q))
+    return response
+
+def log_payload(log, student):
+    """JSON shape of one attendance row for the live dashboard."""
+    return {
+        'id': log.id,
+        'student_name': student.name,
+        'roll_no': student.roll_no,
+        'semester': student.semester,
+        'subject': log.subject,
+        'time': log.timestamp.strftime('%H:%M:%S'),
+        'date': log.timestamp.strftime('%Y-%m-%d'),
+        'status': log.status
+    }
+
+def get_current_class(student_semester, now=None, lab_name=None):
+    """Checks the timetable for a class running for a specific semester (at `now`, default: current time).
+
+    With `lab_name` (the lab of the scanner), only classes held in that lab match.
+    """
     
     # 1. Check Manual Override First
+    manual_class_status = state.get('manual_class_status')
     if manual_class_status['active']:
         # If manual class is for ALL or matches specific semester
         if manual_class_status['semester'] == 'All' or manual_class_status['semester'] == str(student_semester):
-            print(f"DEBUG: Using Manual Class: {manual_class_status['subject']}")
+            logger.debug("Using Manual Class: %s", manual_class_status['subject'])
             # Create a dummy object behaving like Timetable row
             return type('ManualClass', (object,), {
                 'subject': manual_class_status['subject'],
@@ -65,96 +188,111 @@ def get_current_class(student_semester):
                 'semester': manual_class_status['semester']
             })
     
-    now = datetime.now()
-    current_day = calendar.day_name[now.weekday()] # e.g., "Monday"
-    current_time = now.strftime("%H:%M") # e.g., "09:30"
-    
-    # DEBUG LOGGING
-    print(f"DEBUG: Current Day={current_day}, Time={current_time}, Sem={student_semester}")
+    now = now or datetime.now()
     
-    # Find a class where start <= current <= end AND semester matches
-    ongoing_class = Timetable.query.filter(
-        Timetable.day == current_day,
-        Timetable.semester == student_semester,
-        Timetable.start_time <= current_time,
-        Timetable.end_time >= current_time
-    ).first()
+    # Find a class where start <= current <= end AND semester matches (in-memory index)
+    ongoing_class = timetable_index.current_class(student_semester, now, lab_name=lab_name)
     
+    # Arguments are only formatted when DEBUG is enabled
     if ongoing_class:
-        print(f"DEBUG: Found Class: {ongoing_class.subject} ({ongoing_class.start_time}-{ongoing_class.end_time})")
+        logger.debug("Class lookup at %s (Sem %s, Lab %s): %s (%s-%s)", now, student_semester, lab_name,
+                     ongoing_class.subject, ongoing_class.start_time, ongoing_class.end_time)
     else:
-        print(f"DEBUG: No Class Found for Sem {student_semester}")
+        logger.debug("Class lookup at %s (Sem %s, Lab %s): no class", now, student_semester, lab_name)
         
     return ongoing_class
 
 @app.route('/download_excel')
 def download_excel():
-    # Query all attendance records joined with Student
-    results = db.session.query(
-        Student.name, 
-        Student.roll_no, 
-        Student.semester, 
-        Attendance.subject, 
-        Attendance.timestamp, 
-        Attendance.status
-    ).join(Attendance, Student.id == Attendance.student_id).all()
-    
-    # Create a list of dictionaries
-    data = []
-    for row in results:
-        data.append({
-            'Student Name': row.name,
-            'Register No': row.roll_no,
-            'Semester': row.semester,
-            'Subject': row.subject,
-            'Date': row.timestamp.strftime('%Y-%m-%d'),
-            'Time': row.timestamp.strftime('%H:%M:%S'),            'Status': row.status
-        })
-        
-    df = pd.DataFrame(data)
+    # Optional slice filters: ?date_from=&date_to=&semester=&subject=&format=xlsx|csv
+    filters = {
+        'date_from': request.args.get('date_from'),
+        'date_to': request.args.get('date_to'),
+        'semester': request.args.get('semester'),
+        'subject': request.args.get('subject')
+    }
+    query = attendance_export_query(**filters)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Create an in-memory output file
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Attendance')
-        
-    output.seek(0)
+    if request.args.get('format') == 'csv':
+        # Rows go out as they are fetched, memory stays flat
+        return Response(
+            stream_with_context(stream_csv(query)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename=attendance_log_{stamp}.csv'}
+        )
     
-    return send_file(
-        output,
+    # XLSX needs the zip directory at the end, so it is written to a temp
+    # file in write-only mode (constant memory) and then streamed from disk
+    # For an explicit date range (date_from) the workbook also gets an
+    # 'Attendance %' sheet per student and subject (the report loads the
+    # whole range, so never for the full history) and a 'Durations' sheet
+    # of paired LOGIN/LOGOUT sessions (also with ?durations=1), written one
+    # day at a time
+    ranged = parse_day(filters['date_from']) is not None
+    start_day = parse_day(filters['date_from']) or first_log_day()
+    end_day = parse_day(filters['date_to']) or date.today()
+    report = None
+    if ranged and start_day <= end_day:
+        report = filter_sessions(report_cache.get(filters['semester'], start_day, end_day),
+                                 subject=filters['subject'])
+    sessions = None
+    if ranged or request.args.get('durations') == '1':
+        sessions = iter_sessions_for_export(start_day, end_day, filters['semester'], filters['subject'])
+    path = build_xlsx_file(query, sessions, report)
+    return Response(
+        stream_file_and_remove(path),
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'attendance_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        headers={
+            'Content-Disposition': f'attachment; filename=attendance_log_{stamp}.xlsx',
+            'Content-Length': str(os.path.getsize(path))
+        }
     )
     
-from sqlalchemy import func, or_
+from sqlalchemy import or_
 
 def get_active_student_count():
-    """Calculates how many students are currently logged in."""
-    today_start = datetime.combine(date.today(), datetime.min.time())
-    
-    # Subquery: Get the latest timestamp for each student (for today)
-    subquery = db.session.query(
-        Attendance.student_id,
-        func.max(Attendance.timestamp).label('max_time')
-    ).filter(Attendance.timestamp >= today_start).group_by(Attendance.student_id).subquery()
-    
-    # query: Find records that match the latest timestamp and have status 'LOGIN'
-    count = db.session.query(Attendance).join(
-        subquery,
-        (Attendance.student_id == subquery.c.student_id) & 
-        (Attendance.timestamp == subquery.c.max_time)
-    ).filter(Attendance.status == 'LOGIN').count()
-    
-    return count
+    """Calculates how many students are currently logged in (from the presence table)."""
+    return active_student_count()
 
-    return count
+@app.route('/api/presence')
+def api_presence():
+    """Students currently inside, optionally filtered by ?lab= or ?subject=."""
+    rows = students_in_lab(request.args.get('lab'), request.args.get('subject'))
+    return jsonify({
+        'count': len(rows),
+        'students': [{
+            'name': student.name,
+            'roll_no': student.roll_no,
+            'semester': student.semester,
+            'subject': presence.subject,
+            'lab_name': presence.lab_name,
+            'since': presence.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+        } for student, presence in rows]
+    })
 
 @app.route('/api/latest_log_id')
 def latest_log_id():
     last_log = Attendance.query.order_by(Attendance.id.desc()).first()
     return jsonify({'last_id': last_log.id if last_log else 0})
 
+@app.route('/api/logs_since/<int:last_id>')
+def logs_since(last_id):
+    """Attendance rows newer than `last_id` (keyset on Attendance.id), oldest first."""
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    rows = db.session.query(Attendance, Student).join(
+        Student, Student.id == Attendance.student_id
+    ).filter(Attendance.id > last_id).order_by(Attendance.id.asc()).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'logs': [log_payload(log, student) for log, student in rows],
+        'last_id': rows[-1][0].id if rows else last_id,
+        'has_more': has_more,
+        'active_count': get_active_student_count()
+    })
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -187,17 +325,24 @@ def admin_dashboard():
 
 def get_all_current_classes():
     """Returns a list of all classes currently running across all semesters."""
-    now = datetime.now()
-    current_day = calendar.day_name[now.weekday()] # e.g., "Monday"
-    current_time = now.strftime("%H:%M") # e.g., "09:30"
-    
-    classes = Timetable.query.filter(
-        Timetable.day == current_day,
-        Timetable.start_time <= current_time,
-        Timetable.end_time >= current_time
-    ).all()
-    
-    return classes
+    return timetable_index.current_classes(datetime.now())
+
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_MAX_PAGE_SIZE = 200
+
+def encode_log_cursor(log):
+    """Opaque 'next page' cursor for the dashboard: '<iso timestamp>_<id>'."""
+    return f"{log.timestamp.isoformat()}_{log.id}"
+
+def decode_log_cursor(value):
+    """Parses a cursor from encode_log_cursor; returns None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        timestamp, log_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        return None # Ignore invalid cursors, show the first page
 
 @app.route('/dashboard')
 def public_dashboard():
@@ -228,23 +373,31 @@ def public_dashboard():
             )
         )
     
-    # Show recent attendance (limit 50 if no filter, else all)
-    if not (date_filter or subject_filter or search_query):
-        recent_logs = query.order_by(Attendance.timestamp.desc()).limit(50).all()
-        # Get latest ID for polling from the unfiltered recent list (or just the very latest global)
-        # Actually safer to always get the absolute latest ID for polling to work regardless of filter
-        latest_global = Attendance.query.order_by(Attendance.id.desc()).first()
-        last_id = latest_global.id if latest_global else 0
-    else:
-        recent_logs = query.order_by(Attendance.timestamp.desc()).all()
-        # For polling, we still use the global latest arg
-        latest_global = Attendance.query.order_by(Attendance.id.desc()).first()
-        last_id = latest_global.id if latest_global else 0
+    # Keyset pagination on (timestamp, id): bounded work per page however broad the filter
+    page_size = max(1, min(request.args.get('page_size', DASHBOARD_PAGE_SIZE, type=int), DASHBOARD_MAX_PAGE_SIZE))
+    cursor = decode_log_cursor(request.args.get('cursor'))
+    if cursor:
+        cursor_time, cursor_id = cursor
+        query = query.filter(or_(
+            Attendance.timestamp < cursor_time,
+            (Attendance.timestamp == cursor_time) & (Attendance.id < cursor_id)
+        ))
+    
+    recent_logs = query.order_by(Attendance.timestamp.desc(), Attendance.id.desc()).limit(page_size + 1).all()
+    next_cursor = None
+    if len(recent_logs) > page_size:
+        recent_logs = recent_logs[:page_size]
+        next_cursor = encode_log_cursor(recent_logs[-1])
+    
+    # Polling/live updates always track the absolute latest ID regardless of filter
+    latest_global = Attendance.query.order_by(Attendance.id.desc()).first()
+    last_id = latest_global.id if latest_global else 0
 
     active_count = get_active_student_count()
     current_classes = get_all_current_classes()
     
-    return render_template('dashboard.html', logs=recent_logs, active_count=active_count, last_id=last_id, current_classes=current_classes)
+    return render_template('dashboard.html', logs=recent_logs, active_count=active_count, last_id=last_id, current_classes=current_classes,
+                           next_cursor=next_cursor, page_size=page_size)
 
 @app.route('/analytics')
 @login_required
@@ -259,55 +412,122 @@ def daily_stats():
     start_date = end_date - timedelta(days=6)
     
     # Initialize dictionary for last 7 days with 0
-    daily_counts = {}
+    counts = {}
     current_date = start_date
     while current_date <= end_date:
-        daily_counts[current_date.strftime('%Y-%m-%d')] = 0
+        counts[current_date.strftime('%Y-%m-%d')] = 0
         current_date += timedelta(days=1)
     
-    # Query logs from last 7 days
-    logs = db.session.query(
-        func.date(Attendance.timestamp).label('date'), 
-        func.count(Attendance.id).label('count')
-    ).filter(
-        Attendance.timestamp >= datetime.combine(start_date, datetime.min.time())
-    ).group_by('date').all()
-    
-    # Update counts
-    for log in logs:
-        # log.date might be a string or date object depending on SQLite/SQLAlchemy version
-        # Ensure it matches the key format
-        log_date = str(log.date)
-        if log_date in daily_counts:
-            daily_counts[log_date] = log.count
+    # Read the pre-aggregated per-day rollups (O(days), not O(rows))
+    for day, total in daily_counts(start_date, end_date).items():
+        counts[day.strftime('%Y-%m-%d')] = total
             
     return jsonify({
-        'dates': list(daily_counts.keys()),
-        'counts': list(daily_counts.values())
+        'dates': list(counts.keys()),
+        'counts': list(counts.values())
     })
 
 @app.route('/api/semester_stats')
 @login_required
 def semester_stats():
-    # Aggregate attendance counts by semester
-    # We join Attendance with Student to filter/group by semester
-    stats = db.session.query(
-        Student.semester,
-        func.count(Attendance.id).label('count')
-    ).join(Attendance, Student.id == Attendance.student_id)\
-    .group_by(Student.semester).all()
-    
+    # Aggregate attendance counts by semester (from the rollups)
     data = {}
     # Ensure we label them nicely
-    for row in stats:
-        label = f"Semester {row.semester}"
-        data[label] = row.count
+    for semester, count in semester_counts():
+        label = f"Semester {semester}"
+        data[label] = count
         
     return jsonify({
         'labels': list(data.keys()),
         'data': list(data.values())
     })
 
+@app.route('/api/session_hours')
+@login_required
+def api_session_hours():
+    """Lab time per student and subject from paired LOGIN/LOGOUT sessions.
+
+    Optional filters: ?date_from=&date_to= (YYYY-MM-DD, default: this month),
+    ?roll_no=, ?semester=, ?subject=. Add ?detail=1 to list every session.
+    """
+    today = date.today()
+    start_day = parse_day(request.args.get('date_from')) or today.replace(day=1)
+    end_day = parse_day(request.args.get('date_to')) or today
+    if end_day < start_day:
+        return jsonify({'status': 'error', 'message': 'date_to is before date_from'}), 400
+    
+    sessions = filter_sessions(
+        session_cache.sessions_between(start_day, end_day),
+        roll_no=request.args.get('roll_no'),
+        semester=request.args.get('semester'),
+        subject=request.args.get('subject')
+    )
+    totals = session_hours(sessions)
+    
+    response = {
+        'date_from': start_day.isoformat(),
+        'date_to': end_day.isoformat(),
+        'totals': [
+            {
+                'roll_no': row.roll_no,
+                'student_name': row.name,
+                'semester': row.semester,
+                'subject': row.subject,
+                'sessions': int(row.sessions),
+                'open_sessions': int(row.open_sessions),
+                'minutes': float(row.minutes),
+                'hours': round(float(row.minutes) / 60, 2)
+            }
+            for row in totals.itertuples(index=False)
+        ]
+    }
+    if request.args.get('detail'):
+        response['sessions'] = [
+            {
+                'roll_no': row.roll_no,
+                'subject': row.subject,
+                'login': row.login.isoformat(),
+                'logout': row.logout.isoformat() if row.closed else None,
+                'minutes': round(float(row.minutes), 1) if row.closed else None
+            }
+            for row in sessions.itertuples(index=False)
+        ]
+    return jsonify(response)
+
+@app.route('/api/attendance_report')
+@login_required
+def api_attendance_report():
+    """Attendance % per student and subject: timetable occurrences vs. sessions attended.
+
+    Optional filters: ?semester=, ?date_from=&date_to= (YYYY-MM-DD, default:
+    first recorded day to today), ?subject= (substring).
+    """
+    start_day = parse_day(request.args.get('date_from')) or first_log_day()
+    end_day = parse_day(request.args.get('date_to')) or date.today()
+    if end_day < start_day:
+        return jsonify({'status': 'error', 'message': 'date_to is before date_from'}), 400
+    
+    report = filter_sessions(
+        report_cache.get(request.args.get('semester'), start_day, end_day),
+        subject=request.args.get('subject')
+    )
+    return jsonify({
+        'date_from': start_day.isoformat(),
+        'date_to': end_day.isoformat(),
+        'rows': [
+            {
+                'roll_no': row.roll_no,
+                'student_name': row.name,
+                'semester': row.semester,
+                'subject': row.subject,
+                'scheduled': int(row.scheduled),
+                'attended': int(row.attended),
+                'percent': float(row.percent)
+            }
+            for row in report.itertuples(index=False)
+        ]
+    })
+
 @app.route('/students', methods=['GET', 'POST'])
 @login_required
 def students():
@@ -322,12 +542,71 @@ def students():
             try:
                 db.session.add(new_student)
                 db.session.commit()
+                student_cache.invalidate()
+                report_cache.invalidate()
             except Exception as e:
                 return f"Error: {e}"
             return redirect(url_for('students'))
             
     all_students = Student.query.all()
-    return render_template('students.html', students=all_students)
+    pending_count = sum(1 for student in all_students if not student.enrolled)
+    return render_template('students.html', students=all_students, pending_count=pending_count)
+
+@app.route('/api/students/import', methods=['POST'])
+@login_required
+def import_students():
+    """Bulk-adds students from an uploaded CSV/XLSX roster (form field `file`).
+
+    Columns: name / Student Name, roll_no / Register No, semester, and an
+    optional fingerprint_id (blank: next free sensor slot). Valid rows are
+    added in one commit; the response lists every rejected row by line.
+    ?dry_run=1 validates without saving.
+    """
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'status': 'error', 'message': 'No file uploaded'}), 400
+    
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        run = import_roster(upload.stream, upload.filename, dry_run=dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except RosterFormatError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    if run.imported and not dry_run:
+        student_cache.invalidate()
+        report_cache.invalidate()
+        logger.info("Roster import: %s students added, %s rows rejected", run.imported, len(run.errors))
+    return jsonify(run.summary())
+
+@app.route('/students/export')
+@login_required
+def export_students():
+    """Roster as CSV (default) or ?format=xlsx, optionally ?semester=; re-importable as is."""
+    query = roster_query(request.args.get('semester'))
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if request.args.get('format') == 'xlsx':
+        path = build_roster_xlsx(query)
+        return Response(
+            stream_file_and_remove(path),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={
+                'Content-Disposition': f'attachment; filename=students_{stamp}.xlsx',
+                'Content-Length': str(os.path.getsize(path))
+            }
+        )
+    return Response(
+        stream_with_context(stream_roster_csv(query)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=students_{stamp}.csv'}
+    )
 
 @app.route('/delete_student/<int:id>', methods=['POST'])
 @login_required
@@ -336,14 +615,19 @@ def delete_student(id):
     fingerprint_id = student.fingerprint_id # Get ID before deleting
     
     try:
+        subtract_student(student.id, student.semester)
         db.session.delete(student)
         
         # Queue hardware deletion
-        print(f"Queueing deletion for Fingerprint ID {fingerprint_id}")
-        cmd = Command(type='DELETE', payload=str(fingerprint_id))
-        db.session.add(cmd)
+        logger.info("Queueing deletion for Fingerprint ID %s", fingerprint_id)
+        queue_for_devices('DELETE', fingerprint_id, devices.known())
         
         db.session.commit()
+        archive.delete_student(id)
+        command_notifier.notify()
+        student_cache.invalidate()
+        session_cache.invalidate()
+        report_cache.invalidate()
         
     except Exception as e:
         return f"Error deleting student: {e}"
@@ -364,13 +648,19 @@ def edit_student(id):
     # If fingerprint ID changed, we might need to delete old one or warn user.
     # For now, we assume user knows what they are doing (e.g. they registered a new finger manually)
     
+    move_student(student.id, student.semester, semester)
     student.name = name
     student.roll_no = roll_no
     student.semester = semester
+    if int(fingerprint_id) != student.fingerprint_id:
+        student.enrolled = True # A hand-entered id comes from a finger registered on the sensor
     student.fingerprint_id = int(fingerprint_id)
     
     try:
         db.session.commit()
+        student_cache.invalidate()
+        session_cache.invalidate() # Cached sessions carry the name/semester
+        report_cache.invalidate()
     except Exception as e:
         return f"Error updating student: {e}"
     
@@ -391,6 +681,8 @@ def timetable():
         entry = Timetable(day=day, start_time=start, end_time=end, subject=subject, lab_name=lab, semester=semester)
         db.session.add(entry)
         db.session.commit()
+        timetable_index.invalidate()
+        report_cache.invalidate() # Scheduled occurrences changed
         return redirect(url_for('timetable'))
 
     semester_filter = request.args.get('semester')
@@ -409,6 +701,8 @@ def delete_timetable(id):
     try:
         db.session.delete(entry)
         db.session.commit()
+        timetable_index.invalidate()
+        report_cache.invalidate() # Scheduled occurrences changed
     except Exception as e:
         return f"Error deleting timetable entry: {e}"
     return redirect(url_for('timetable'))
@@ -428,6 +722,8 @@ def edit_timetable(id):
         
         try:
             db.session.commit()
+            timetable_index.invalidate()
+            report_cache.invalidate() # Scheduled occurrences changed
             return redirect(url_for('timetable'))
         except Exception as e:
             return f"Error updating timetable entry: {e}"
@@ -436,85 +732,244 @@ def edit_timetable(id):
 
 @app.route('/api/start_registration')
 def start_registration():
-    global registration_status
-    cmd = Command(type='REGISTER', payload=None)
-    db.session.add(cmd)
+    if enrollment.status()['active']:
+        return jsonify({'status': 'error', 'message': 'An enrollment session is running'})
+    # ?device_id= picks the scanner; with exactly one online, that one is used
+    device_id = devices.target_device(request.args.get('device_id'))
+    queue_command('REGISTER', device_id=device_id)
     db.session.commit()
-    registration_status = {'status': 'waiting', 'message': 'Request sent to sensor...', 'fingerprint_id': None}
+    command_notifier.notify()
+    devices.set_registration(device_id, {'status': 'waiting', 'message': 'Request sent to sensor...', 'fingerprint_id': None})
     return jsonify({'status': 'started'})
 
+@app.route('/api/enrollment/start', methods=['POST'])
+@login_required
+def start_enrollment():
+    """Enrolls a list of students back to back.
+
+    Body: {"student_ids": [...]} (in that order), or {"semester": "3"} / {}
+    for every student not enrolled yet (by roll number). ?device_id= or
+    "device_id" picks the scanner, as for /api/start_registration.
+    """
+    data = request.get_json(silent=True) or {}
+    if enrollment.status()['active']:
+        return jsonify({'status': 'error', 'message': 'An enrollment session is already running'}), 409
+    
+    if data.get('student_ids'):
+        ids = [int(i) for i in data['student_ids']]
+        found = {student.id: student for student in Student.query.filter(Student.id.in_(ids)).all()}
+        students = [found[i] for i in dict.fromkeys(ids) if i in found]
+    else:
+        query = Student.query.filter(Student.enrolled.is_(False))
+        if data.get('semester'):
+            query = query.filter(Student.semester == str(data['semester']))
+        students = query.order_by(Student.roll_no).all()
+    if not students:
+        return jsonify({'status': 'error', 'message': 'No students to enroll'}), 400
+    
+    device_id = devices.target_device(data.get('device_id') or request.args.get('device_id'))
+    if enrollment.start(students, device_id) is None:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': 'An enrollment session is already running'}), 409
+    db.session.commit()
+    command_notifier.notify()
+    event_broker.publish('enrollment', {'active': True})
+    return jsonify(enrollment.status())
+
+@app.route('/api/enrollment')
+@login_required
+def enrollment_status():
+    """Progress of the enrollment session, per student."""
+    if enrollment.check_command():
+        db.session.commit()
+        command_notifier.notify()
+    return jsonify(enrollment.status())
+
+@app.route('/api/enrollment/skip', methods=['POST'])
+@login_required
+def skip_enrollment():
+    """Skips the student whose turn it is (e.g. not present)."""
+    if not enrollment.skip():
+        return jsonify({'status': 'error', 'message': 'No enrollment session running'}), 400
+    db.session.commit()
+    command_notifier.notify()
+    return jsonify(enrollment.status())
+
+@app.route('/api/enrollment/cancel', methods=['POST'])
+@login_required
+def cancel_enrollment():
+    if not enrollment.cancel():
+        return jsonify({'status': 'error', 'message': 'No enrollment session running'}), 400
+    return jsonify(enrollment.status())
+
+def reconcile_devices():
+    """?device_id= (or "device_id" in the body), else every scanner seen so far."""
+    data = request.get_json(silent=True) or {}
+    device_id = data.get('device_id') or request.args.get('device_id')
+    return [device_id] if device_id else sorted(devices.known())
+
+@app.route('/api/reconcile/start', methods=['POST'])
+@login_required
+def start_reconcile():
+    """Asks each scanner for its occupied fingerprint slots (one LIST_IDS command each)."""
+    device_ids = reconcile_devices()
+    if not device_ids:
+        return jsonify({'status': 'error', 'message': 'No scanner has connected yet'}), 400
+    reconcile.request_snapshots(device_ids)
+    db.session.commit()
+    command_notifier.notify()
+    return jsonify({'status': 'started', 'devices': device_ids})
+
+@app.route('/api/reconcile')
+@login_required
+def reconcile_report():
+    """Sensor slots vs. students per scanner: orphan slots and missing templates."""
+    return jsonify({'reports': [reconcile.report(device_id) for device_id in reconcile_devices()]})
+
+@app.route('/api/reconcile/fix', methods=['POST'])
+@login_required
+def fix_reconcile():
+    """Queues one DELETE per orphan slot from the latest snapshot.
+
+    {"mark_missing": true} also flags students whose template is gone as
+    not enrolled, for batch enrollment.
+    """
+    data = request.get_json(silent=True) or {}
+    results = [
+        reconcile.fix(device_id, mark_missing=bool(data.get('mark_missing')))
+        for device_id in reconcile_devices()
+    ]
+    db.session.commit()
+    command_notifier.notify()
+    return jsonify({'reports': results})
+
 @app.route('/api/get_command')
 def get_command():
-    cmd = Command.query.order_by(Command.created_at.asc()).first()
+    # Legacy one-shot poll: older bridges never acknowledge, so delivery counts as done
+    device_id = request.args.get('device_id') or DEFAULT_DEVICE
+    cmd = claim_next(device_id)
     if cmd:
-        data = {'type': cmd.type, 'id': int(cmd.payload) if cmd.payload else None}
-        db.session.delete(cmd)
+        acknowledge(cmd.id, device_id, result='Delivered (no acknowledgement)')
         db.session.commit()
-        return jsonify(data)
+        return jsonify(command_payload(cmd))
+    db.session.commit()
     return jsonify({'type': None})
 
+COMMAND_MAX_WAIT = 30 # Seconds a long-poll may be held open
+COMMAND_RECHECK_SECONDS = 1.0 # Picks up commands queued by other worker processes
+
+@app.route('/api/commands/next')
+def next_command():
+    """Long-poll for the next command: ?device_id=&wait=<seconds>.
+
+    Returns as soon as a command is claimed for this device (commands queued
+    in this process wake the request immediately), or {'type': None} after
+    `wait` seconds. A bridge driving several scanners repeats device_id once
+    per scanner, so all of them share one open request; the response's
+    device_id says which scanner the command is for.
+    """
+    device_ids = request.args.getlist('device_id') or [DEFAULT_DEVICE]
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), COMMAND_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    deadline = time.monotonic() + wait
+    
+    while True:
+        generation = command_notifier.generation()
+        cmd = None
+        for device_id in device_ids:
+            cmd = claim_next(device_id)
+            if cmd:
+                break
+        db.session.commit() # Also releases the pooled connection while waiting
+        if cmd:
+            return jsonify(command_payload(cmd))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return jsonify({'type': None})
+        command_notifier.wait(generation, min(remaining, COMMAND_RECHECK_SECONDS))
+
+@app.route('/api/commands/<int:command_id>/ack', methods=['POST'])
+def ack_command(command_id):
+    """Bridge confirms a claimed command: {"device_id", "status": "done"|"failed", "result"}."""
+    data = request.json or {}
+    device_id = data.get('device_id') or DEFAULT_DEVICE
+    if not acknowledge(command_id, device_id, ok=data.get('status') != 'failed', result=data.get('result')):
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': 'Command is not claimed by this device'}), 409
+    db.session.commit()
+    command_notifier.notify() # The device may take its next command now
+    return jsonify({'status': 'ok'})
+
 @app.route('/api/registration_status')
 def get_registration_status():
-    return jsonify(registration_status)
+    return jsonify(devices.registration(request.args.get('device_id')))
 
 @app.route('/api/registration_result', methods=['POST'])
 def registration_result():
-    global registration_status
     data = request.json
+    device_id = data.get('device_id') or DEFAULT_DEVICE
     if data.get('status') == 'success':
-        registration_status = {
+        devices.set_registration(device_id, {
             'status': 'success', 
             'fingerprint_id': data.get('fingerprint_id')
-        }
+        })
     else:
-        registration_status = {
+        devices.set_registration(device_id, {
             'status': 'failed', 
             'message': data.get('message', 'Unknown error')
-        }
+        })
+    
+    # During an enrollment session the result belongs to the student whose turn it is
+    if enrollment.on_result(device_id, data.get('status') == 'success',
+                            data.get('fingerprint_id'), data.get('message')):
+        db.session.commit()
+        command_notifier.notify()
+        student_cache.invalidate()
+        event_broker.publish('enrollment', {'active': enrollment.status()['active']})
     return jsonify({'ack': True})
 
 @app.route('/api/lcd_status', methods=['GET', 'POST'])
 def lcd_status():
-    global lcd_message
     if request.method == 'POST':
         data = request.json
         lcd_message = data.get('message', '')
+        device_id = data.get('device_id') or DEFAULT_DEVICE
+        devices.set_lcd(device_id, lcd_message)
+        event_broker.publish('lcd', {'message': lcd_message, 'device_id': device_id})
         return jsonify({'status': 'updated'})
-    return jsonify({'message': lcd_message})
-
-# Global State
-manual_session = {
-    'active': False,
-    'subject': None,
-    'semester': None,
-    'lab_name': 'Manual Mode'
-}
+    return jsonify({'message': state.get('lcd_message')})
 
 @app.context_processor
 def inject_manual_status():
-    return dict(manual_session=manual_session)
+    return dict(manual_session=state.get('manual_session'))
 
 @app.route('/api/set_manual_session', methods=['POST'])
 @login_required
 def set_manual_session():
-    global manual_session
     data = request.json
     
-    manual_session['active'] = True
-    manual_session['subject'] = data.get('subject')
-    manual_session['semester'] = data.get('semester')
-    manual_session['lab_name'] = data.get('lab_name', 'Manual Mode')
+    manual_session = {
+        'active': True,
+        'subject': data.get('subject'),
+        'semester': data.get('semester'),
+        'lab_name': data.get('lab_name', 'Manual Mode')
+    }
+    state.set('manual_session', manual_session)
     
     return jsonify({'status': 'success', 'session': manual_session})
 
 @app.route('/api/stop_manual_session', methods=['POST'])
 @login_required
 def stop_manual_session():
-    global manual_session
-    manual_session['active'] = False
-    manual_session['subject'] = None
-    manual_session['semester'] = None
+    def stop(manual_session):
+        manual_session['active'] = False
+        manual_session['subject'] = None
+        manual_session['semester'] = None
+        return manual_session
     
+    state.update('manual_session', stop)
     return jsonify({'status': 'success'})
 
 @app.route('/api/scan', methods=['POST'])
@@ -525,16 +980,57 @@ def api_scan():
     if fingerprint_id is None:
         return jsonify({'status': 'error', 'message': 'No fingerprint ID provided'}), 400
     
-    student = Student.query.filter_by(fingerprint_id=fingerprint_id).first()
+    # The scanner's lab decides which class the scan belongs to
+    lab_name = data.get('lab_name') or devices.lab_of(data.get('device_id') or DEFAULT_DEVICE)
+    result, student, new_logs = process_scan(fingerprint_id, lab_name=lab_name)
+    if new_logs:
+        with scan_phase_seconds.time(phase='commit'):
+            db.session.commit()
+        invalidate_sessions(new_logs)
+        publish_new_logs([(log, student) for log in new_logs])
+    return jsonify(result)
+
+def publish_new_logs(logs):
+    """Pushes freshly committed (attendance row, student) pairs to live dashboards."""
+    last_id = max(log.id for log, _ in logs)
+    # Streams served by other workers pick this up from the shared state
+    state.update('last_log_id', lambda old: max(old or 0, last_id))
+    event_broker.publish('attendance', {
+        'last_id': last_id,
+        'active_count': get_active_student_count(),
+        'logs': [log_payload(log, student) for log, student in logs]
+    })
+
+def invalidate_sessions(logs):
+    """Drops cached session days that new rows can change (a replayed scan may land in the past)."""
+    for day in {log.timestamp.date() for log in logs}:
+        session_cache.invalidate(day)
+        report_cache.invalidate(day)
+
+def process_scan(fingerprint_id, scanned_at=None, lab_name=None):
+    """Applies one fingerprint scan to the session without committing.
+
+    `scanned_at` is the device time of the scan (default: now); the class is
+    resolved at that moment so replayed scans land in the right session.
+    `lab_name` is the scanner's lab (None: any lab).
+    Returns (response dict, student or None, list of new Attendance rows).
+    """
+    scanned_at = scanned_at or datetime.now()
+    phases = PhaseTimer(scan_phase_seconds)
+    student = student_cache.get(fingerprint_id)
     
     if not student:
-        return jsonify({'status': 'error', 'message': 'Student not found', 'student_name': 'Unknown'}), 200
+        scans_total.inc(status='not_found')
+        return {'status': 'error', 'message': 'Student not found', 'student_name': 'Unknown'}, None, []
         
-    # Get the latest log for this student (regardless of subject) to determine current state
-    last_global_log = Attendance.query.filter_by(student_id=student.id).order_by(Attendance.timestamp.desc()).first()
+    # The presence row mirrors the latest log for this student (regardless of subject),
+    # so a single primary-key read gives the current state
+    last_global_log = db.session.get(StudentPresence, student.id)
+    phases.lap('student_lookup')
     
     # Determine the class running RIGHT NOW (Check Manual First)
     current_class = None
+    manual_session = state.get('manual_session')
     
     if manual_session['active'] and manual_session['semester'] == student.semester:
         # Create a mock class object or dict
@@ -550,114 +1046,265 @@ def api_scan():
             semester=manual_session['semester']
         )
     else:
-        current_class = get_current_class(student.semester)
+        current_class = get_current_class(student.semester, now=scanned_at, lab_name=lab_name)
+    phases.lap('class_resolution')
     
-    # LOGIC MATRIX:
-    # 1. Last state was LOGIN (Student is inside a class)
-    #    - If Current Class is SAME as Last Log Subject -> LOGOUT (End session)
-    #    - If Current Class is DIFFERENT (New Subject) -> LOGOUT Old Subject, LOGIN New Subject (Switch)
-    #    - If NO Current Class (Break/End) -> LOGOUT Old Subject (End session)
+    # LOGIC MATRIX lives in attendance_engine.decide (shared with batch replays)
+    decision = decide(
+        last_global_log.status if last_global_log else None,
+        last_global_log.subject if last_global_log else None,
+        current_class.subject if current_class else None
+    )
     
-    # 2. Last state was LOGOUT (Student is free)
-    #    - If Current Class exists -> LOGIN New Subject
-    #    - If NO Current Class -> REJECT (No class running)
+    if not decision.accepted:
+        scans_total.inc(status='rejected')
+        return {
+            'status': 'error', 
+            'message': decision.message,
+            'student_name': student.name
+        }, student, []
     
-    if last_global_log and last_global_log.status == 'LOGIN':
-        # Student is currently "IN" a class
-        
-        if current_class:
-            if current_class.subject == last_global_log.subject:
-                # Same class, just leaving
-                new_status = 'LOGOUT'
-                subject = current_class.subject
-                message = f'Logged Out: {subject}'
-                db.session.add(Attendance(student_id=student.id, status=new_status, subject=subject))
-                
-            else:
-                # Different class started! (Class change took place while student was inside)
-                # 1. Auto-Logout previous
-                db.session.add(Attendance(student_id=student.id, status='LOGOUT', subject=last_global_log.subject))
-                
-                # 2. Login new
-                new_status = 'LOGIN'
-                subject = current_class.subject
-                message = f'Switched: {last_global_log.subject} -> {subject}'
-                db.session.add(Attendance(student_id=student.id, status=new_status, subject=subject))
-                
-        else:
-            # Class ended, now it's break time, but student forgot to scan out
-            # Auto-logout them now
-            new_status = 'LOGOUT'
-            subject = last_global_log.subject
-            message = f'Logged Out (Break): {subject}'
-            db.session.add(Attendance(student_id=student.id, status=new_status, subject=subject))
-            
-    else:
-        # Student is currently "OUT"
-        if current_class:
-            new_status = 'LOGIN'
-            subject = current_class.subject
-            message = f'Logged In: {subject}'
-            db.session.add(Attendance(student_id=student.id, status=new_status, subject=subject))
-        else:
-            return jsonify({
-                'status': 'error', 
-                'message': 'No Class Running',
-                'student_name': student.name
-            }), 200
+    new_logs = [
+        Attendance(student_id=student.id, status=status, subject=subject, timestamp=scanned_at)
+        for status, subject in decision.events
+    ]
+    new_status, subject = decision.events[-1]
 
-    db.session.commit()
-    # Determine what check-type happened for the final response (Login or Logout)
-    # If we switched (Logout+Login), the primary action communicated is the LOGIN to the new class
-    # but the logs show both.
-    
-    scan_type_resp = 'LOGIN' if current_class and (not last_global_log or last_global_log.status == 'LOGOUT' or (last_global_log.status=='LOGIN' and last_global_log.subject != current_class.subject)) else 'LOGOUT'
-    
-    # If we just logged out during break
-    if not current_class:
-        scan_type_resp = 'LOGOUT'
-        subject_resp = last_global_log.subject if last_global_log else "Unknown"
-    else:
-        subject_resp = current_class.subject
+    # Keep the materialized presence row in the same transaction as the log
+    db.session.add_all(new_logs)
+    record_logs(student.semester, new_logs)
+    record_presence(student.id, new_status, subject,
+                    getattr(current_class, 'lab_name', None) if new_status == 'LOGIN' else None,
+                    timestamp=scanned_at)
+    phases.lap('write')
+    scans_total.inc(status='success', scan_type=decision.scan_type)
 
-    return jsonify({
+    return {
         'status': 'success', 
-        'message': message, 
+        'message': decision.message, 
         'student_name': student.name,
-        'subject': subject_resp,
-        'scan_type': scan_type_resp
-    })
+        'subject': decision.subject,
+        'scan_type': decision.scan_type
+    }, student, new_logs
 
-@app.route('/api/reset_system_data', methods=['POST'])
-@login_required
-def reset_system_data():
-    try:
-        # 1. Clear Database Tables
-        num_students = db.session.query(Student).delete()
-        num_attendance = db.session.query(Attendance).delete()
-        num_timetable = db.session.query(Timetable).delete()
-        
-        # 2. Queue Hardware Reset Command
-        # We don't need a payload for EMPTY_DB
-        cmd = Command(type='EMPTY_DB')
-        db.session.add(cmd)
-        
+# Receipts are kept this long; a journaled scan older than this is no longer
+# replayed (its receipt may be gone), so resending it cannot apply it twice
+RECEIPT_RETENTION = timedelta(days=int(os.environ.get('RECEIPT_RETENTION_DAYS', 30)))
+RECEIPT_SWEEP_INTERVAL = 3600 # Seconds between retention sweeps (per process)
+RECEIPT_SWEEP_CHUNK = 1000
+_last_receipt_sweep = 0.0
+
+def prune_scan_receipts(now=None):
+    """Deletes receipts older than RECEIPT_RETENTION, one short transaction per chunk. Returns the count."""
+    cutoff = (now or datetime.now()) - RECEIPT_RETENTION
+    removed = 0
+    while True:
+        scan_ids = [scan_id for (scan_id,) in db.session.query(ScanReceipt.scan_id).filter(
+            ScanReceipt.created_at < cutoff).limit(RECEIPT_SWEEP_CHUNK)]
+        if not scan_ids:
+            return removed
+        ScanReceipt.query.filter(ScanReceipt.scan_id.in_(scan_ids)).delete(synchronize_session=False)
         db.session.commit()
+        removed += len(scan_ids)
+
+@app.route('/api/scan_batch', methods=['POST'])
+def api_scan_batch():
+    """Ingests scans buffered by a bridge in one transaction, idempotently.
+
+    Body: {"device_id": str, "lab_name": str,
+           "scans": [{"scan_id": str, "fingerprint_id": int, "timestamp": ISO str}, ...]}
+    (device_id / lab_name may also be given per scan.)
+    Scans are applied in device-time order (stable, so each student's scans
+    keep their relative order) through the same state machine as /api/scan,
+    and every Attendance row is written by a single commit. Results come back
+    in request order. A scan_id that was already applied returns its stored
+    result instead of being applied twice, so a bridge can safely resend a
+    batch after a lost response or a failed commit.
+    Receipts are kept for RECEIPT_RETENTION, so a scan whose device time is
+    older than that is refused (and acknowledged) instead of applied.
+    """
+    body = request.json or {}
+    scans = body.get('scans')
+    if not isinstance(scans, list):
+        return jsonify({'status': 'error', 'message': 'No scans provided'}), 400
+    known_devices = devices.known()
+    # Entries that are not objects are answered as invalid scans below
+    scans = [scan if isinstance(scan, dict) else {} for scan in scans]
+    
+    scan_ids = [str(scan.get('scan_id') or '') for scan in scans]
+    receipts = {
+        receipt.scan_id: receipt for receipt in
+        ScanReceipt.query.filter(ScanReceipt.scan_id.in_([i for i in scan_ids if i])).all()
+    } if scans else {}
+    
+    results = [None] * len(scans)
+    applied = {} # scan_id -> result, for duplicates inside this batch
+    replay_cutoff = datetime.now() - RECEIPT_RETENTION
+    order = sorted(range(len(scans)), key=lambda i: parse_device_time(scans[i].get('timestamp')))
+    published = []
+    
+    for i in order:
+        scan, scan_id = scans[i], scan_ids[i]
+        fingerprint_id = scan.get('fingerprint_id')
+        if not scan_id or fingerprint_id is None:
+            results[i] = {'scan_id': scan_id, 'status': 'error', 'message': 'Invalid scan'}
+            continue
         
-        print(f"System Reset: Deleted {num_students} students, {num_attendance} logs, {num_timetable} classes.")
-        
-        return jsonify({
-            'status': 'success', 
-            'message': f'System Reset Complete. Deleted {num_students} students, {num_attendance} logs.'
-        })
+        if scan_id in receipts:
+            results[i] = dict(json.loads(receipts[scan_id].result), scan_id=scan_id, duplicate=True)
+            continue
+        if scan_id in applied:
+            results[i] = dict(applied[scan_id], scan_id=scan_id, duplicate=True)
+            continue
+        if parse_device_time(scan.get('timestamp')) < replay_cutoff:
+            results[i] = {'scan_id': scan_id, 'status': 'error', 'message': 'Scan too old to replay'}
+            continue
         
+        lab_name = scan.get('lab_name') or body.get('lab_name') or devices.lab_of(
+            scan.get('device_id') or body.get('device_id') or DEFAULT_DEVICE, known_devices)
+        result, student, new_logs = process_scan(fingerprint_id, scanned_at=parse_device_time(scan.get('timestamp')),
+                                                 lab_name=lab_name)
+        db.session.add(ScanReceipt(scan_id=scan_id, result=json.dumps(result)))
+        applied[scan_id] = result
+        published.extend((log, student) for log in new_logs)
+        results[i] = dict(result, scan_id=scan_id)
+    
+    try:
+        with scan_phase_seconds.time(phase='commit'):
+            db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    if published:
+        invalidate_sessions([log for log, _ in published])
+        publish_new_logs(published)
+    
+    global _last_receipt_sweep
+    if time.time() - _last_receipt_sweep >= RECEIPT_SWEEP_INTERVAL:
+        _last_receipt_sweep = time.time()
+        pruned = prune_scan_receipts()
+        if pruned:
+            logger.info("Pruned %s scan receipts older than %s days", pruned, RECEIPT_RETENTION.days)
+    return jsonify({'status': 'ok', 'results': results})
+
+def parse_device_time(value):
+    """Device timestamps are ISO strings from the bridge's clock; fall back to now.
+
+    Returns naive local time (like every stored timestamp); an offset is
+    converted, so one batch can mix both forms and still be sorted.
+    """
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+@app.route('/api/reset_system_data', methods=['POST'])
+@login_required
+def reset_system_data():
+    # Runs in the background in short transactions so scans keep working; poll /api/purge
+    data = request.get_json(silent=True) or {}
+    started, job = purge_job.start(app, 'all', snapshot=bool(data.get('snapshot')), device_ids=devices.known())
+    if not started:
+        return jsonify({'status': 'error', 'message': 'A reset or purge is already running', 'job': job}), 409
+    logger.info("System reset started")
+    return jsonify({'status': 'started', 'message': 'System reset started', 'job': job}), 202
+
+@app.route('/api/purge', methods=['POST'])
+@login_required
+def start_purge():
+    """Deletes attendance logs by date range (inclusive days) and/or semester in the background."""
+    data = request.get_json(silent=True) or {}
+    start, end = parse_day(data.get('date_from')), parse_day(data.get('date_to'))
+    semester = str(data.get('semester') or '').strip() or None
+    if (data.get('date_from') and start is None) or (data.get('date_to') and end is None):
+        return jsonify({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}), 400
+    if start is None and end is None and semester is None:
+        return jsonify({'status': 'error', 'message': 'Give a date range or a semester (use the system reset to delete everything)'}), 400
+    started, job = purge_job.start(
+        app, 'purge',
+        start=datetime.combine(start, datetime.min.time()) if start else None,
+        end=datetime.combine(end, datetime.min.time()) + timedelta(days=1) if end else None,
+        semester=semester, snapshot=bool(data.get('snapshot'))
+    )
+    if not started:
+        return jsonify({'status': 'error', 'message': 'A reset or purge is already running', 'job': job}), 409
+    return jsonify({'status': 'started', 'job': job}), 202
+
+@app.route('/api/purge', methods=['GET'])
+@login_required
+def purge_status():
+    return jsonify(purge_job.status())
 
 def init_db():
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
+        # Existing databases gain the presence table empty; seed it from the log once
+        if StudentPresence.query.first() is None and Attendance.query.first() is not None:
+            rebuild_presence()
+        if AttendanceRollup.query.first() is None and Attendance.query.first() is not None:
+            rebuild_rollups()
+
+@app.cli.command('rebuild-presence')
+def rebuild_presence_command():
+    """Rebuild the StudentPresence table from the Attendance log."""
+    count = rebuild_presence()
+    print(f"Presence rebuilt for {count} students.")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Backfill the analytics rollup table from the Attendance log."""
+    count = rebuild_rollups()
+    print(f"Rollups rebuilt: {count} day/semester/subject/status rows.")
+
+@app.cli.command('archive-attendance')
+@click.option('--keep-months', default=2, show_default=True, help='Months kept live, the current one included.')
+@click.option('--before', 'before', default=None, help='Archive months before YYYY-MM instead.')
+@click.option('--vacuum', is_flag=True, help='VACUUM the main database afterwards to return the freed pages.')
+def archive_attendance_command(keep_months, before, vacuum):
+    """Move closed months of attendance into the yearly archive files."""
+    if before:
+        cutoff = datetime.strptime(before, '%Y-%m')
+    else:
+        today = date.today()
+        months = today.year * 12 + today.month - 1 - (max(keep_months, 1) - 1)
+        cutoff = datetime(months // 12, months % 12 + 1, 1)
+    moved = archive.archive_before(cutoff)
+    for month, count in moved:
+        print(f"{month}: {count} rows archived")
+    print(f"Archived {sum(count for _, count in moved)} rows before {cutoff:%Y-%m} into {archive.archive_dir()}")
+    if vacuum:
+        db.session.remove()
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('VACUUM')
+
+@app.cli.command('archive-status')
+def archive_status_command():
+    """List the archived months and the rows left in the live table."""
+    for month, rows, archived_at in archive.partitions():
+        print(f"{month}: {rows} rows (archived {archived_at})")
+    print(f"Live table: {Attendance.query.count()} rows")
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables, columns and indexes on an existing database."""
+    created = upgrade_schema()
+    print(f"Created: {', '.join(created) if created else 'nothing (already up to date)'}")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot query regresses to a full table scan."""
+    failed = False
+    for label, plan, ok in check_query_plans():
+        print(f"[{'OK' if ok else 'FULL SCAN'}] {label}")
+        for line in plan:
+            print(f"    {line}")
+        failed = failed or not ok
+    if failed:
+        raise SystemExit(1)
 
 if __name__ == '__main__':
     if not os.path.exists('attendance.db'):
@@ -0,0 +1,301 @@
+"""Time-partitioned attendance archive (cold storage in separate SQLite files).
+
+archive_before() moves every Attendance row of a closed month out of the
+live table into archive/attendance_<year>.db, one month per transaction
+(the year file is ATTACHed to the main database for an INSERT ... SELECT
+followed by the matching DELETE). The live table then only holds recent
+months, so the hot path (last log per student, today's counts, the
+dashboard) works on a small table and index that stay in the page cache.
+
+Readers that need the whole history go through this module:
+iter_rows() / rows_frame() read the archive files directly, oldest year
+first, and sessions.py / export.py merge them with the live table. The
+rollups, presence rebuild and student deletion include archived rows too.
+
+Each file records its archived months in a `partitions` table. The newest
+Attendance row always stays live as well, a reference point for
+/api/latest_log_id (ids themselves never go back: the table is AUTOINCREMENT).
+"""
+import glob
+import os
+import re
+import sqlite3
+from datetime import datetime, date
+
+import pandas as pd
+
+from database import db
+
+FILE_PATTERN = re.compile(r'attendance_(\d{4})\.db$')
+ROW_COLUMNS = ['id', 'student_id', 'timestamp', 'status', 'subject']
+
+ARCHIVE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS {db}.attendance ("
+    " id INTEGER PRIMARY KEY, student_id INTEGER NOT NULL, timestamp DATETIME,"
+    " status VARCHAR(20) NOT NULL, subject VARCHAR(100) NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS {db}.ix_archive_timestamp ON attendance (timestamp)",
+    "CREATE INDEX IF NOT EXISTS {db}.ix_archive_student ON attendance (student_id, timestamp)",
+    "CREATE TABLE IF NOT EXISTS {db}.partitions ("
+    " month TEXT PRIMARY KEY, rows INTEGER NOT NULL, archived_at TEXT NOT NULL)",
+]
+
+
+def main_db_path():
+    return db.engine.url.database
+
+
+def archive_dir():
+    """ARCHIVE_DIR, or an 'archive' folder next to the main database."""
+    return os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(os.path.abspath(main_db_path())), 'archive')
+
+
+def archive_path(year):
+    return os.path.join(archive_dir(), f'attendance_{year}.db')
+
+
+def archived_years():
+    years = []
+    for path in glob.glob(os.path.join(archive_dir(), 'attendance_*.db')):
+        match = FILE_PATTERN.search(path)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def _bound(value):
+    """Datetime/date -> the text form SQLAlchemy stores timestamps in (compares as text)."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _month_start(year, month):
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+
+def _read(year):
+    conn = sqlite3.connect(f'file:{archive_path(year)}?mode=ro', uri=True)
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+def _years_between(start, end):
+    return [year for year in archived_years()
+            if (start is None or year >= start.year) and (end is None or year <= end.year)]
+
+
+# --- Archiving ---
+
+def archive_before(cutoff):
+    """Moves rows with timestamp < cutoff (a datetime) into the archive, month by month.
+
+    Returns [(month 'YYYY-MM', rows moved)].
+    """
+    engine_conn = sqlite3.connect(main_db_path(), timeout=30, isolation_level=None)
+    try:
+        months = [row[0] for row in engine_conn.execute(
+            "SELECT DISTINCT substr(timestamp, 1, 7) FROM attendance WHERE timestamp < ? ORDER BY 1",
+            (_bound(cutoff),)
+        )]
+        os.makedirs(archive_dir(), exist_ok=True)
+        moved = []
+        for month in months:
+            year, number = int(month[:4]), int(month[5:7])
+            start, end = _month_start(year, number), min(_month_start(year, number + 1), cutoff)
+            moved.append((month, _archive_range(engine_conn, year, start, end, month)))
+        return moved
+    finally:
+        engine_conn.close()
+
+
+def _archive_range(conn, year, start, end, month):
+    conn.execute("ATTACH DATABASE ? AS cold", (archive_path(year),))
+    try:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement.format(db='cold'))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # INSERT OR IGNORE + delete-what-was-copied make a rerun after a crash harmless
+            conn.execute(
+                "INSERT OR IGNORE INTO cold.attendance (id, student_id, timestamp, status, subject)"
+                " SELECT id, student_id, timestamp, status, subject FROM main.attendance"
+                " WHERE timestamp >= ? AND timestamp < ?"
+                " AND id != (SELECT max(id) FROM main.attendance)",
+                (_bound(start), _bound(end))
+            )
+            moved = conn.execute(
+                "DELETE FROM main.attendance WHERE timestamp >= ? AND timestamp < ?"
+                " AND id IN (SELECT id FROM cold.attendance WHERE timestamp >= ? AND timestamp < ?)",
+                (_bound(start), _bound(end), _bound(start), _bound(end))
+            ).rowcount
+            conn.execute(
+                "INSERT INTO cold.partitions (month, rows, archived_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(month) DO UPDATE SET rows = rows + excluded.rows, archived_at = excluded.archived_at",
+                (month, moved, datetime.now().isoformat(timespec='seconds'))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE cold")
+    return moved
+
+
+def partitions():
+    """[(month, rows, archived_at)] for every archived month."""
+    result = []
+    for year in archived_years():
+        with _read(year) as conn:
+            result += conn.execute("SELECT month, rows, archived_at FROM partitions ORDER BY month").fetchall()
+    return result
+
+
+# --- Reading ---
+
+def iter_rows(start=None, end=None, subject=None, student_id=None):
+    """Archived rows with start <= timestamp < end, ordered by (timestamp, id).
+
+    Yields (id, student_id, timestamp, status, subject); `subject` is a
+    case-insensitive substring, like the export filter.
+    """
+    where, params = [], []
+    if start is not None:
+        where.append("timestamp >= ?")
+        params.append(_bound(start))
+    if end is not None:
+        where.append("timestamp < ?")
+        params.append(_bound(end))
+    if subject:
+        where.append("subject LIKE ?")
+        params.append(f'%{subject}%')
+    if student_id is not None:
+        where.append("student_id = ?")
+        params.append(student_id)
+    sql = "SELECT id, student_id, timestamp, status, subject FROM attendance"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp, id"
+
+    for year in _years_between(start, end):
+        conn = _read(year)
+        try:
+            for row_id, row_student, timestamp, status, row_subject in conn.execute(sql, params):
+                yield row_id, row_student, datetime.fromisoformat(timestamp), status, row_subject
+        finally:
+            conn.close()
+
+
+def rows_frame(start=None, end=None):
+    """iter_rows() as a DataFrame (timestamps parsed in one vectorized call)."""
+    frames = []
+    for year in _years_between(start, end):
+        with _read(year) as conn:
+            frames.append(pd.read_sql_query(
+                "SELECT id, student_id, timestamp, status, subject FROM attendance"
+                " WHERE timestamp >= ? AND timestamp < ?",
+                conn, params=(_bound(start or date.min), _bound(end or datetime.max))
+            ))
+    if not frames:
+        return pd.DataFrame(columns=ROW_COLUMNS)
+    rows = pd.concat(frames, ignore_index=True)
+    rows['timestamp'] = pd.to_datetime(rows['timestamp'], format='ISO8601')
+    return rows
+
+
+def first_day():
+    """Day of the oldest archived row, or None."""
+    for year in archived_years():
+        with _read(year) as conn:
+            first = conn.execute("SELECT min(timestamp) FROM attendance").fetchone()[0]
+        if first:
+            return datetime.fromisoformat(first).date()
+    return None
+
+
+def daily_counts(student_id=None):
+    """[(day, student_id, subject, status, count)] over the archive (rollup input)."""
+    sql = ("SELECT date(timestamp), student_id, subject, status, count(*) FROM attendance"
+           + (" WHERE student_id = ?" if student_id is not None else "")
+           + " GROUP BY 1, 2, 3, 4")
+    params = (student_id,) if student_id is not None else ()
+    rows = []
+    for year in archived_years():
+        with _read(year) as conn:
+            rows += [(date.fromisoformat(day), *rest) for day, *rest in conn.execute(sql, params)]
+    return rows
+
+
+def latest_per_student():
+    """{student_id: (status, subject, timestamp)} of each student's newest archived row."""
+    latest = {}
+    for year in archived_years(): # Later years overwrite earlier ones
+        with _read(year) as conn:
+            for student_id, status, subject, timestamp in conn.execute(
+                "SELECT student_id, status, subject, timestamp FROM ("
+                " SELECT student_id, status, subject, timestamp, row_number() OVER ("
+                "  PARTITION BY student_id ORDER BY timestamp DESC, id DESC) AS rank FROM attendance)"
+                " WHERE rank = 1"
+            ):
+                latest[student_id] = (status, subject, datetime.fromisoformat(timestamp))
+    return latest
+
+
+# --- Deleting ---
+
+def delete_student(student_id):
+    """Drops a deleted student's archived rows. Returns how many were removed."""
+    removed = 0
+    for year in archived_years():
+        conn = sqlite3.connect(archive_path(year), timeout=30)
+        try:
+            with conn:
+                removed += conn.execute("DELETE FROM attendance WHERE student_id = ?", (student_id,)).rowcount
+        finally:
+            conn.close()
+    return removed
+
+
+def purge(start=None, end=None, student_ids=None):
+    """Deletes archived rows in [start, end), optionally only for `student_ids`.
+
+    Returns [(day, student_id, subject, status, count)] of what was removed,
+    for the rollups.
+    """
+    where, params = [], []
+    if start is not None:
+        where.append("timestamp >= ?")
+        params.append(_bound(start))
+    if end is not None:
+        where.append("timestamp < ?")
+        params.append(_bound(end))
+    if student_ids is not None:
+        where.append(f"student_id IN ({','.join('?' * len(student_ids))})")
+        params += list(student_ids)
+    condition = " WHERE " + " AND ".join(where) if where else ""
+
+    removed = []
+    for year in _years_between(start, end):
+        conn = sqlite3.connect(archive_path(year), timeout=30)
+        try:
+            with conn:
+                removed += [(date.fromisoformat(day), *rest) for day, *rest in conn.execute(
+                    "SELECT date(timestamp), student_id, subject, status, count(*) FROM attendance"
+                    + condition + " GROUP BY 1, 2, 3, 4", params
+                )]
+                conn.execute("DELETE FROM attendance" + condition, params)
+        finally:
+            conn.close()
+    return removed
+
+
+def clear():
+    """Removes every archive file (system reset). Returns how many were removed."""
+    paths = [archive_path(year) for year in archived_years()]
+    for path in paths:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return len(paths)
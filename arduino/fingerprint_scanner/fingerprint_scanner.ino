@@ -95,6 +95,8 @@ void loop() // run over and over again
       updateLCD("CMD: EMPTY_DB", "Processing...");
       delay(1000);
       emptyDatabase();
+    } else if (command == "LIST_IDS") {
+      listTemplateIds();
     } else {
       // Debug: Print unknown commands to help troubleshoot
       // Serial.print("UNKNOWN_CMD:"); Serial.println(command);
@@ -114,7 +116,7 @@ void deleteFingerprint(int id) {
     updateLCD("Deleted ID #", String(id));
     delay(2000); // feedback
   } else {
-    Serial.print("Something wrong");
+    Serial.println("Something wrong");
     updateLCD("Delete Failed", "ID: " + String(id));
     delay(2000);
   }
@@ -123,7 +125,45 @@ void deleteFingerprint(int id) {
   updateLCD("Place Finger");
 }
 
-// ... handleEnrollment() ...
+// Replies "IDS:" + 64 hex digits: the sensor's template index (slots 0-255),
+// one bit per slot, bit 0 of the first byte = slot 0. Used by the server to
+// reconcile the sensor with the student table. Replies "IDS_FAIL" if the
+// sensor does not answer, rather than an empty table the server would trust.
+void listTemplateIds() {
+  uint8_t table[32];
+  memset(table, 0, sizeof(table));
+
+  // ReadIndexTable (0x1F), page 0: the whole table in one packet
+  uint8_t data[] = {0x1F, 0x00};
+  Adafruit_Fingerprint_Packet packet(FINGERPRINT_COMMANDPACKET, sizeof(data), data);
+  finger.writeStructuredPacket(packet);
+  if (finger.getStructuredPacket(&packet) != FINGERPRINT_OK || packet.type != FINGERPRINT_ACKPACKET) {
+    Serial.println("IDS_FAIL");
+    return;
+  }
+
+  if (packet.data[0] == FINGERPRINT_OK) {
+    memcpy(table, packet.data + 1, sizeof(table));
+  } else {
+    // Fallback for modules without the command: probe the slots enrollment uses
+    for (int i = 1; i < 128; i++) {
+      uint8_t p = finger.loadModel(i);
+      if (p == FINGERPRINT_OK) {
+        table[i / 8] |= 1 << (i % 8);
+      } else if (p == FINGERPRINT_PACKETRECIEVEERR) {
+        Serial.println("IDS_FAIL");
+        return;
+      }
+    }
+  }
+
+  Serial.print("IDS:");
+  for (int i = 0; i < 32; i++) {
+    if (table[i] < 0x10) Serial.print('0');
+    Serial.print(table[i], HEX);
+  }
+  Serial.println();
+}
 
 // ... handleEnrollment() ...
 
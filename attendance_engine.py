@@ -0,0 +1,167 @@
+"""Pure LOGIN/LOGOUT state machine shared by /api/scan, batch ingestion and replays.
+
+No Flask or database access here: callers resolve the student's prior state
+and the class running at scan time, and persist whatever events come back.
+
+LOGIC MATRIX:
+1. Last state was LOGIN (Student is inside a class)
+   - If Current Class is SAME as Last Log Subject -> LOGOUT (End session)
+   - If Current Class is DIFFERENT (New Subject) -> LOGOUT Old Subject, LOGIN New Subject (Switch)
+   - If NO Current Class (Break/End) -> LOGOUT Old Subject (End session)
+2. Last state was LOGOUT (Student is free)
+   - If Current Class exists -> LOGIN New Subject
+   - If NO Current Class -> REJECT (No class running)
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Attendance rows to write for one scan, in order: [(status, subject), ...]
+Decision = namedtuple('Decision', ['accepted', 'events', 'message', 'scan_type', 'subject'])
+
+# Event kinds in replay output
+LOGIN = 'login'
+LOGOUT = 'logout'
+SWITCH_LOGOUT = 'switch_logout' # Auto-logout of the old subject when a new class started
+BREAK_LOGOUT = 'break_logout' # Scan after the class ended
+
+
+def decide(prior_status, prior_subject, current_subject):
+    """Applies one scan.
+
+    `prior_status`/`prior_subject` describe the student's latest log (None if
+    they never scanned); `current_subject` is the class running at scan time
+    (None if none). Returns a Decision; `events` is empty when rejected.
+    """
+    if prior_status == 'LOGIN':
+        # Student is currently "IN" a class
+        if current_subject is not None:
+            if current_subject == prior_subject:
+                # Same class, just leaving
+                return Decision(True, [('LOGOUT', current_subject)],
+                                f'Logged Out: {current_subject}', 'LOGOUT', current_subject)
+            # Different class started! (Class change took place while student was inside)
+            return Decision(True, [('LOGOUT', prior_subject), ('LOGIN', current_subject)],
+                            f'Switched: {prior_subject} -> {current_subject}', 'LOGIN', current_subject)
+        # Class ended, now it's break time, but student forgot to scan out
+        return Decision(True, [('LOGOUT', prior_subject)],
+                        f'Logged Out (Break): {prior_subject}', 'LOGOUT', prior_subject)
+
+    # Student is currently "OUT"
+    if current_subject is not None:
+        return Decision(True, [('LOGIN', current_subject)],
+                        f'Logged In: {current_subject}', 'LOGIN', current_subject)
+    return Decision(False, [], 'No Class Running', None, None)
+
+
+EVENT_COLUMNS = ['scan', 'student_id', 'timestamp', 'status', 'subject', 'kind']
+
+
+def replay_scalar(scans, initial_state=None):
+    """Reference replay: calls decide() row by row.
+
+    `scans` is a DataFrame with student_id, timestamp and subject (the class
+    running at scan time, NaN/None for none). Returns the events frame with
+    EVENT_COLUMNS, where `scan` is the index label of the source scan.
+    """
+    state = dict(initial_state or {})
+    rows = []
+    ordered = scans.sort_values(['student_id', 'timestamp'], kind='stable')
+    for label, student_id, timestamp, subject in zip(
+            ordered.index, ordered['student_id'], ordered['timestamp'], ordered['subject']):
+        subject = None if pd.isna(subject) else subject
+        prior_status, prior_subject = state.get(student_id, (None, None))
+        decision = decide(prior_status, prior_subject, subject)
+        for status, event_subject in decision.events:
+            if status == 'LOGIN':
+                kind = LOGIN
+            elif len(decision.events) == 2:
+                kind = SWITCH_LOGOUT
+            elif subject is None:
+                kind = BREAK_LOGOUT
+            else:
+                kind = LOGOUT
+            rows.append((label, student_id, timestamp, status, event_subject, kind))
+        if decision.events:
+            state[student_id] = decision.events[-1]
+    return pd.DataFrame(rows, columns=EVENT_COLUMNS)
+
+
+def replay_frame(scans, initial_state=None):
+    """Vectorized replay of many scans in one pass; same output as replay_scalar.
+
+    Within a student's day, consecutive scans with the same running class form
+    a run. Inside a run the student simply toggles LOGIN/LOGOUT, and entering
+    a new class always starts with a LOGIN (plus an auto-logout if they were
+    still inside the previous one). Only the first run depends on the prior
+    state, so everything reduces to group-wise shifts and cumulative counts.
+
+    `initial_state` maps student_id -> (status, subject) before the first scan.
+    """
+    if scans.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    df = scans[['student_id', 'timestamp', 'subject']].copy()
+    df['scan'] = df.index
+    # np.lexsort is stable: ties keep their original (arrival) order
+    df = df.iloc[np.lexsort((df['timestamp'].to_numpy(), df['student_id'].to_numpy()))].reset_index(drop=True)
+    df['subject'] = df['subject'].astype(object).where(df['subject'].notna(), None)
+
+    # Rows are grouped by student, so "previous row" is a plain shift as long
+    # as the first row of each student is patched with its initial state
+    student = df['student_id'].to_numpy()
+    subject = df['subject'].to_numpy()
+    has_class = df['subject'].notna().to_numpy()
+    index = np.arange(len(df))
+    first_of_student = np.ones(len(df), dtype=bool)
+    first_of_student[1:] = student[1:] != student[:-1]
+    new_run = first_of_student.copy()
+    new_run[1:] |= subject[1:] != subject[:-1]
+    run_start = np.maximum.accumulate(np.where(new_run, index, 0))
+    student_start = np.maximum.accumulate(np.where(first_of_student, index, 0))
+    position = index - run_start
+    first_run = run_start == student_start
+
+    # Prior state for each student's first scan
+    initial_state = initial_state or {}
+    init_status = df['student_id'].map(pd.Series({k: v[0] for k, v in initial_state.items()}, dtype=object))
+    init_subject = df['student_id'].map(pd.Series({k: v[1] for k, v in initial_state.items()}, dtype=object)).to_numpy()
+    init_in = (init_status == 'LOGIN').to_numpy()
+
+    # Class runs: the first run starts "already inside" when the student was
+    # logged into this very subject; every other class run starts with LOGIN
+    offset = (first_run & init_in & (init_subject == subject)).astype(int)
+    inside_after = has_class & ((position + offset) % 2 == 0)
+
+    # State before each scan = state after the previous scan of the same student
+    prev_inside = np.roll(inside_after, 1)
+    prev_inside[first_of_student] = init_in[first_of_student]
+    prev_subject = np.roll(subject, 1)
+    prev_subject[first_of_student] = init_subject[first_of_student]
+
+    null_run = ~has_class
+    # In a no-class run only the first scan can act (break logout); the rest are rejected
+    break_logout = null_run & (position == 0) & prev_inside
+    switching = has_class & (position == 0) & (offset == 0) & prev_inside
+    login = inside_after
+    logout = has_class & ~inside_after
+
+    frames = []
+    base = df[['scan', 'student_id', 'timestamp']]
+    for mask, status, values, kind, order in (
+        (switching, 'LOGOUT', prev_subject, SWITCH_LOGOUT, 0),
+        (break_logout, 'LOGOUT', prev_subject, BREAK_LOGOUT, 0),
+        (logout, 'LOGOUT', subject, LOGOUT, 0),
+        (login, 'LOGIN', subject, LOGIN, 1),
+    ):
+        part = base[mask].copy()
+        part['status'] = status
+        part['subject'] = values[mask]
+        part['kind'] = kind
+        part['_row'] = np.flatnonzero(mask)
+        part['_order'] = order
+        frames.append(part)
+
+    events = pd.concat(frames, ignore_index=True).sort_values(['_row', '_order'], kind='stable')
+    return events[EVENT_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,157 @@
+"""Attendance percentage per student and subject: scheduled classes vs. sessions attended.
+
+The weekly timetable is expanded into dated occurrences for the range, every
+student of a semester is expected at each occurrence of their semester, and
+an occurrence counts as attended when one of the student's sessions for that
+subject overlaps it. Everything is done with frame merges/groupbys, so the
+cost is a handful of pandas operations regardless of the number of students.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from cache_sync import SharedGeneration
+from database import db, Student
+from sessions import session_cache
+from timetable_index import timetable_index, MINUTES_PER_DAY
+
+# Ranges reaching today also change as classes start, so they expire
+LIVE_REPORT_TTL = 60
+# Reports kept by ReportCache; the least recently used goes first
+REPORT_CACHE_MAX = int(os.environ.get('REPORT_CACHE_MAX', 32))
+REPORT_COLUMNS = ['student_id', 'name', 'roll_no', 'semester', 'subject', 'scheduled', 'attended', 'percent']
+
+
+def slot_frame(slots):
+    """Timetable slots as a frame with weekday and minutes since midnight."""
+    frame = pd.DataFrame(slots, columns=slots[0]._fields if slots else None)
+    if frame.empty:
+        return pd.DataFrame(columns=['slot_id', 'weekday', 'start_minute', 'end_minute', 'subject', 'semester'])
+    weekday = frame['start_minute'] // MINUTES_PER_DAY
+    return pd.DataFrame({
+        'slot_id': frame['id'],
+        'weekday': weekday,
+        'start_minute': frame['start_minute'] - weekday * MINUTES_PER_DAY,
+        'end_minute': frame['end_minute'] - weekday * MINUTES_PER_DAY,
+        'subject': frame['subject'],
+        'semester': frame['semester'],
+    })
+
+
+def expand_occurrences(slots, start_day, end_day, now=None):
+    """Every dated class occurrence between start_day and end_day that has already started.
+
+    A class is running through its end minute (get_current_class matches
+    end_time inclusively), so an occurrence ends one minute after end_time.
+    """
+    now = now or datetime.now()
+    days = pd.DataFrame({'day': pd.date_range(start_day, end_day, freq='D')})
+    days['weekday'] = days['day'].dt.weekday
+    occurrences = days.merge(slot_frame(slots), on='weekday')
+    occurrences['start'] = occurrences['day'] + pd.to_timedelta(occurrences['start_minute'].astype(int), unit='m')
+    occurrences['end'] = occurrences['day'] + pd.to_timedelta(occurrences['end_minute'].astype(int) + 1, unit='m')
+    occurrences = occurrences[occurrences['start'] <= now].reset_index(drop=True)
+    occurrences['occurrence'] = np.arange(len(occurrences))
+    return occurrences
+
+
+def load_students(semester=None):
+    query = db.session.query(Student.id, Student.name, Student.roll_no, Student.semester)
+    if semester:
+        query = query.filter(Student.semester == str(semester))
+    return pd.DataFrame.from_records(query.all(), columns=['student_id', 'name', 'roll_no', 'semester'])
+
+
+def compute_report(students, occurrences, sessions):
+    """Joins expected occurrences against sessions; one row per (student, subject)."""
+    if students.empty or occurrences.empty:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    scheduled = occurrences.groupby(['semester', 'subject']).size().rename('scheduled').reset_index()
+    grid = students.merge(scheduled, on='semester')
+
+    attended = pd.Series(dtype=int, name='attended',
+                         index=pd.MultiIndex.from_arrays([[], []], names=['student_id', 'subject']))
+    if not sessions.empty:
+        sessions = sessions[['student_id', 'semester', 'subject', 'login', 'logout']].copy()
+        sessions['day'] = sessions['login'].dt.normalize()
+        # An open session still proves the student was in at login time
+        sessions['until'] = sessions['logout'].fillna(sessions['login'])
+        matched = sessions.merge(
+            occurrences[['occurrence', 'semester', 'subject', 'day', 'start', 'end']],
+            on=['semester', 'subject', 'day']
+        )
+        matched = matched[(matched['login'] < matched['end']) & (matched['until'] >= matched['start'])]
+        attended = matched.drop_duplicates(['student_id', 'occurrence']).groupby(
+            ['student_id', 'subject']).size().rename('attended')
+
+    report = grid.merge(attended.reset_index(), on=['student_id', 'subject'], how='left')
+    report['attended'] = report['attended'].fillna(0).astype(int)
+    report['percent'] = (100 * report['attended'] / report['scheduled']).round(1)
+    return report.sort_values(['semester', 'roll_no', 'subject'], kind='stable')[REPORT_COLUMNS].reset_index(drop=True)
+
+
+class ReportCache:
+    """Reports keyed by (semester, start_day, end_day).
+
+    invalidate(day) drops only the ranges a change on that day can affect
+    (the day before too, since a session logged in then may close on `day`).
+    At most max_reports are kept, least recently used first out.
+    """
+
+    def __init__(self, max_reports=REPORT_CACHE_MAX):
+        self._lock = threading.Lock()
+        self._reports = OrderedDict()
+        self.max_reports = max_reports
+        self.generation = SharedGeneration('cache_generation:reports')
+
+    def invalidate(self, day=None):
+        """Drops the affected reports here; other workers drop all of theirs."""
+        with self._lock:
+            if day is None:
+                self._reports.clear()
+            else:
+                earliest = day - timedelta(days=1)
+                for key in [k for k in self._reports if k[1] <= day and k[2] >= earliest]:
+                    del self._reports[key]
+        if self.generation.bump():
+            self._drop()
+
+    def _drop(self):
+        with self._lock:
+            self._reports.clear()
+
+    def get(self, semester, start_day, end_day):
+        if self.generation.changed():
+            self._drop()
+        key = (str(semester) if semester else None, start_day, end_day)
+        with self._lock:
+            report, expires = self._reports.get(key, (None, None))
+            if report is not None:
+                self._reports.move_to_end(key)
+        if report is not None and expires is not None and time.monotonic() > expires:
+            report = None
+        if report is None:
+            sessions = session_cache.sessions_between(start_day, end_day)
+            if key[0] is not None and not sessions.empty:
+                sessions = sessions[sessions['semester'] == key[0]]
+            report = compute_report(
+                load_students(key[0]),
+                expand_occurrences(timetable_index.slots(key[0]), start_day, end_day),
+                sessions
+            )
+            expires = time.monotonic() + LIVE_REPORT_TTL if end_day >= date.today() else None
+            with self._lock:
+                self._reports[key] = (report, expires)
+                self._reports.move_to_end(key)
+                while len(self._reports) > self.max_reports:
+                    self._reports.popitem(last=False)
+        return report
+
+
+report_cache = ReportCache()
@@ -0,0 +1,94 @@
+"""Attendance archive: hot-path queries on the full log vs. on the live months only.
+
+Seeds two years of scans, times the dashboard's filtered search (which has
+to walk the log) and the full-history export, then archives every month
+but the last two and times both again. The export must return the same
+rows from the hot + archived union.
+
+Run from the project root:
+    python benchmarks/bench_archive.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app, db  # noqa: E402
+from database import Student, Attendance  # noqa: E402
+from export import attendance_export_query, iter_export_rows  # noqa: E402
+import archive  # noqa: E402
+
+STUDENTS = 500
+DAYS = 730
+DASHBOARD_URL = '/dashboard?search=R00042&subject=phys'
+REPEATS = 20
+
+
+def seed(count):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Student), [
+        {'name': f'Student {i}', 'roll_no': f'R{i:05d}', 'semester': str(1 + i % 6), 'fingerprint_id': i + 1}
+        for i in range(STUDENTS)
+    ])
+    start = datetime.now() - timedelta(days=DAYS)
+    step = DAYS * 86400 / count
+    rows = []
+    for i in range(count):
+        rows.append({'student_id': 1 + i % STUDENTS, 'timestamp': start + timedelta(seconds=i * step),
+                     'status': 'LOGIN' if i // STUDENTS % 2 == 0 else 'LOGOUT',
+                     'subject': ('Physics', 'Chemistry', 'Maths')[i // (2 * STUDENTS) % 3]})
+        if len(rows) == 50000:
+            db.session.execute(insert(Attendance), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Attendance), rows)
+    db.session.commit()
+
+
+def time_dashboard(client):
+    began = time.perf_counter()
+    for _ in range(REPEATS):
+        assert client.get(DASHBOARD_URL).status_code == 200
+    return (time.perf_counter() - began) / REPEATS
+
+
+def time_export():
+    began = time.perf_counter()
+    rows = [tuple(row) for row in iter_export_rows(attendance_export_query())]
+    return rows, time.perf_counter() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    client = app.test_client()
+    with app.app_context():
+        seed(count)
+        hot_before = time_dashboard(client)
+        rows_before, export_before = time_export()
+
+        today = datetime.now()
+        months = today.year * 12 + today.month - 2
+        began = time.perf_counter()
+        moved = archive.archive_before(datetime(months // 12, months % 12 + 1, 1))
+        archive_time = time.perf_counter() - began
+        db.session.remove()
+
+        hot_after = time_dashboard(client)
+        rows_after, export_after = time_export()
+        assert rows_after == rows_before, "export changed after archiving"
+
+        print(f"archived {sum(n for _, n in moved)} of {count} rows ({len(moved)} months) in {archive_time:6.2f} s; "
+              f"{Attendance.query.count()} left live")
+        print(f"dashboard search   full log {hot_before * 1000:8.1f} ms   live only {hot_after * 1000:8.1f} ms")
+        print(f"full export        full log {export_before:8.2f} s    hot+archive {export_after:8.2f} s")
+
+
+if __name__ == '__main__':
+    main()
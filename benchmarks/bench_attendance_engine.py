@@ -0,0 +1,56 @@
+"""Replay throughput of the attendance engine: row-by-row decide() vs. vectorized.
+
+Run from the project root:
+    python benchmarks/bench_attendance_engine.py [scans]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_engine import replay_frame, replay_scalar  # noqa: E402
+
+STUDENTS = 2000
+SUBJECTS = np.array(['Physics Lab', 'Chemistry Lab', 'Networks Lab', 'DBMS Lab', None], dtype=object)
+
+
+def make_scans(count, seed=3):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01T08:00')
+    return pd.DataFrame({
+        'student_id': rng.integers(1, STUDENTS + 1, count),
+        'timestamp': start + rng.integers(0, 120 * 24 * 3600, count).astype('timedelta64[s]'),
+        'subject': SUBJECTS[rng.integers(0, len(SUBJECTS), count)],
+    })
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    scans = make_scans(count)
+
+    vectorized, vec_time = timed(replay_frame, scans)
+    print(f"vectorized {count} scans -> {len(vectorized)} events in {vec_time:6.2f} s")
+
+    # The scalar path is slow; check agreement and extrapolate on a slice
+    sample = scans[scans['student_id'] <= STUDENTS // 10]
+    scalar, scalar_time = timed(replay_scalar, sample)
+    expected = replay_frame(sample)
+    assert scalar.astype(str).equals(expected.astype(str)), "vectorized replay diverged from decide()"
+    per_scan = scalar_time / max(len(sample), 1)
+    print(f"scalar     {len(sample)} scans in {scalar_time:6.2f} s "
+          f"(~{per_scan * count:.1f} s extrapolated to {count})")
+    print(f"speedup    ~{per_scan * count / vec_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
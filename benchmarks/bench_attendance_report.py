@@ -0,0 +1,99 @@
+"""Attendance % report for a whole department: cold (DB + sessions) vs. cached.
+
+Seeds a semester of ~2,000 students with a weekly lab timetable and a term
+of sessions, then times report_cache.get() for the full range.
+
+Run from the project root:
+    python benchmarks/bench_attendance_report.py [students] [weeks]
+"""
+import calendar
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app, db  # noqa: E402
+from database import Student, Timetable, Attendance  # noqa: E402
+from attendance_report import report_cache  # noqa: E402
+from sessions import session_cache  # noqa: E402
+from timetable_index import timetable_index  # noqa: E402
+
+SEMESTER = '3'
+# (day, start, end, subject): two 2-hour labs on three days a week
+SLOTS = [
+    (day, start, end, subject)
+    for day in ('Monday', 'Wednesday', 'Friday')
+    for start, end, subject in (('09:00', '10:59', 'Physics Lab'), ('13:00', '14:59', 'Networks Lab'))
+]
+
+
+def seed(students, weeks):
+    db.drop_all()
+    db.create_all()
+    for day, start, end, subject in SLOTS:
+        db.session.add(Timetable(day=day, start_time=start, end_time=end, subject=subject,
+                                 lab_name='Lab 1', semester=SEMESTER))
+    db.session.add_all([
+        Student(name=f'Student {i}', roll_no=f'R{i:05d}', semester=SEMESTER, fingerprint_id=i)
+        for i in range(1, students + 1)
+    ])
+    db.session.commit()
+
+    first_day = date.today() - timedelta(weeks=weeks)
+    rows = []
+    for offset in range(weeks * 7):
+        day = first_day + timedelta(days=offset)
+        for slot_day, start, _end, subject in SLOTS:
+            if calendar.day_name[day.weekday()] != slot_day:
+                continue
+            begin = datetime.combine(day, datetime.strptime(start, '%H:%M').time())
+            for student_id in range(1, students + 1):
+                if random.random() < 0.8: # ~80% attendance
+                    login = begin + timedelta(minutes=random.randint(0, 20))
+                    rows.append({'student_id': student_id, 'status': 'LOGIN', 'subject': subject, 'timestamp': login})
+                    rows.append({'student_id': student_id, 'status': 'LOGOUT', 'subject': subject,
+                                 'timestamp': login + timedelta(minutes=random.randint(60, 99))})
+    db.session.execute(db.insert(Attendance), rows)
+    db.session.commit()
+    return first_day, len(rows)
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - began
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    weeks = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    random.seed(5)
+
+    with app.app_context():
+        first_day, count = seed(students, weeks)
+        timetable_index.invalidate()
+        end_day = date.today() - timedelta(days=1)
+        print(f"seeded {students} students, {count} attendance rows over {weeks} weeks")
+
+        report, cold = timed(report_cache.get, SEMESTER, first_day, end_day)
+        print(f"cold   (load + pair sessions + report): {cold * 1000:8.1f} ms, {len(report)} rows")
+
+        report_cache.invalidate()
+        report, warm = timed(report_cache.get, SEMESTER, first_day, end_day)
+        print(f"warm   (session days cached):           {warm * 1000:8.1f} ms")
+
+        _, cached = timed(report_cache.get, SEMESTER, first_day, end_day)
+        print(f"cached (report cached):                 {cached * 1000:8.1f} ms")
+        print(f"mean attendance {report['percent'].mean():.1f}%")
+
+        session_cache.invalidate()
+        report_cache.invalidate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Peak Python heap of the /download_excel route, for growing table sizes.
+
+Requests go through the test client and the response body is consumed
+chunk by chunk, so the numbers include everything the route builds (the
+sessions and report sheets, the caches) but not a buffered copy of the
+file. "kept" is what is still allocated after the response is closed and
+the request's objects are collected, e.g. cached frames.
+
+Run from the project root:
+    python benchmarks/bench_export_memory.py
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app, db  # noqa: E402
+from database import Student, Attendance  # noqa: E402
+from sessions import session_cache  # noqa: E402
+from attendance_report import report_cache  # noqa: E402
+
+SIZES = [10000, 50000, 100000]
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(Student, [
+        {'id': i, 'name': f'Student {i}', 'roll_no': f'R{i:05d}', 'semester': str(i % 6 + 1), 'fingerprint_id': i}
+        for i in range(1, 301)
+    ])
+    start = datetime(2024, 1, 1, 8, 0)
+    db.session.bulk_insert_mappings(Attendance, [
+        {'student_id': i % 300 + 1, 'timestamp': start + timedelta(seconds=i * 30),
+         'status': 'LOGIN' if i % 2 else 'LOGOUT', 'subject': f'Subject {i % 12}'}
+        for i in range(rows)
+    ])
+    db.session.commit()
+    db.session.remove()
+    session_cache.invalidate()
+    report_cache.invalidate()
+
+
+def measure(client, label, url):
+    gc.collect()
+    tracemalloc.start()
+    began = time.perf_counter()
+    response = client.get(url, buffered=False)
+    assert response.status_code == 200, response.status_code
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    elapsed = time.perf_counter() - began
+    gc.collect()
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<11} {elapsed:6.2f} s  peak {peak / 1024 / 1024:6.1f} MiB  "
+          f"kept {kept / 1024 / 1024:6.1f} MiB  ({size / 1024 / 1024:.1f} MiB file)")
+
+
+def main():
+    client = app.test_client()
+    for rows in SIZES:
+        with app.app_context():
+            seed(rows)
+        print(f"{rows} rows")
+        measure(client, 'csv', '/download_excel?format=csv')
+        measure(client, 'xlsx', '/download_excel')
+        measure(client, 'xlsx 1 week', '/download_excel?date_from=2024-01-01&date_to=2024-01-07')
+
+
+if __name__ == '__main__':
+    main()
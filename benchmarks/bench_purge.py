@@ -0,0 +1,99 @@
+"""Scan writes during a bulk delete: one big DELETE vs. the chunked background purge.
+
+Seeds the log, then keeps inserting attendance rows from a "scanner"
+thread (one short transaction each, like /api/scan) while everything
+older than a day is deleted, first with a single DELETE in one
+transaction and then with the purge job's chunked transactions. Reports
+how long the scan writes had to wait for the SQLite write lock.
+
+Run from the project root:
+    python benchmarks/bench_purge.py [rows]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app, db, purge_job  # noqa: E402
+from database import Student, Attendance  # noqa: E402
+
+STUDENTS = 200
+
+
+def seed(count):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Student), [
+        {'name': f'Student {i}', 'roll_no': f'R{i:05d}', 'semester': '1', 'fingerprint_id': i + 1}
+        for i in range(STUDENTS)
+    ])
+    start = datetime.now() - timedelta(days=365)
+    for offset in range(0, count, 50000):
+        db.session.execute(insert(Attendance), [
+            {'student_id': 1 + i % STUDENTS, 'timestamp': start + timedelta(minutes=i), 'status': 'LOGIN', 'subject': 'Physics'}
+            for i in range(offset, min(count, offset + 50000))
+        ])
+    db.session.commit()
+
+
+def scanner(stop, waits):
+    """Writes one scan every 20 ms and records each write's latency."""
+    with app.app_context():
+        while not stop.is_set():
+            began = time.perf_counter()
+            try:
+                db.session.add(Attendance(student_id=1, timestamp=datetime.now(), status='LOGIN', subject='Physics'))
+                db.session.commit()
+                waits.append(time.perf_counter() - began)
+            except Exception:
+                db.session.rollback()
+                waits.append(float('inf')) # Gave up waiting for the lock
+            time.sleep(0.02)
+        db.session.remove()
+
+
+def measure(delete):
+    stop, waits = threading.Event(), []
+    thread = threading.Thread(target=scanner, args=(stop, waits))
+    thread.start()
+    time.sleep(0.2)
+    began = time.perf_counter()
+    delete()
+    elapsed = time.perf_counter() - began
+    time.sleep(0.2)
+    stop.set()
+    thread.join()
+    waits.sort()
+    return elapsed, waits[len(waits) // 2], waits[-1], len(waits)
+
+
+def single_delete():
+    db.session.query(Attendance).filter(Attendance.timestamp < datetime.now() - timedelta(days=1)).delete()
+    db.session.commit()
+
+
+def chunked_purge():
+    purge_job.start(app, 'purge', end=datetime.now() - timedelta(days=1))
+    while purge_job.status()['active']:
+        time.sleep(0.05)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with app.app_context():
+        for label, delete in (('single DELETE', single_delete), ('chunked purge', chunked_purge)):
+            seed(count)
+            elapsed, median, worst, scans = measure(delete)
+            print(f"{label:14s} {count} rows in {elapsed:6.2f} s; {scans} scans, "
+                  f"write latency median {median * 1000:6.1f} ms, worst {worst * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Roster import: bulk CSV/XLSX import vs. adding students one form post at a time.
+
+Builds a roster with explicit fingerprint ids (plus a few duplicate and
+invalid rows), imports it with import_roster() in one transaction, and
+compares with the per-student path the /students form takes (one INSERT
+and one commit per student) on a sample of the rows.
+
+Run from the project root:
+    python benchmarks/bench_roster_import.py [rows]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app, db  # noqa: E402
+from database import Student  # noqa: E402
+from roster import import_roster, ROSTER_COLUMNS  # noqa: E402
+
+FORM_SAMPLE = 1000 # Rows timed through the one-at-a-time path
+
+
+def make_rows(count):
+    rows = [[f'Student {i}', f'R{i:06d}', str(1 + i % 6), str(1000 + i)] for i in range(count)]
+    # Every 500th row repeats an earlier roll number, every 700th has a bad id
+    for i in range(499, count, 500):
+        rows[i][1] = rows[i - 1][1]
+    for i in range(699, count, 700):
+        rows[i][3] = 'x'
+    return rows
+
+
+def as_csv(rows):
+    text = '\n'.join([','.join(ROSTER_COLUMNS)] + [','.join(row) for row in rows])
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def as_xlsx(rows):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Students')
+    sheet.append(ROSTER_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def reset():
+    db.drop_all()
+    db.create_all()
+
+
+def bulk(stream, filename):
+    reset()
+    began = time.perf_counter()
+    run = import_roster(stream, filename)
+    db.session.commit()
+    return run, time.perf_counter() - began
+
+
+def one_at_a_time(rows):
+    """Reference: what the /students form does per student (uniqueness enforced by the DB)."""
+    reset()
+    began = time.perf_counter()
+    for name, roll_no, semester, fingerprint_id in rows:
+        try:
+            db.session.add(Student(name=name, roll_no=roll_no, semester=semester, fingerprint_id=int(fingerprint_id)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+    return time.perf_counter() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rows = make_rows(count)
+
+    with app.app_context():
+        run, csv_time = bulk(as_csv(rows), 'roster.csv')
+        print(f"bulk csv   {count} rows: {run.imported} imported, {len(run.errors)} rejected in {csv_time:6.2f} s")
+        assert Student.query.count() == run.imported
+
+        run, xlsx_time = bulk(as_xlsx(rows), 'roster.xlsx')
+        print(f"bulk xlsx  {count} rows: {run.imported} imported, {len(run.errors)} rejected in {xlsx_time:6.2f} s")
+
+        sample = rows[:min(count, FORM_SAMPLE)]
+        form_time = one_at_a_time(sample) * count / len(sample)
+        print(f"form posts {count} rows (extrapolated from {len(sample)}):            {form_time:6.2f} s")
+        print(f"speedup    ~{form_time / csv_time:.0f}x (csv)")
+
+
+if __name__ == '__main__':
+    main()
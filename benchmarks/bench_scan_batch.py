@@ -0,0 +1,84 @@
+"""Throughput: one POST /api/scan per scan vs. /api/scan_batch.
+
+Run from the project root:
+    python benchmarks/bench_scan_batch.py [scans] [batch_size]
+"""
+import calendar
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app, db  # noqa: E402
+from database import Student, Timetable, Attendance  # noqa: E402
+from presence import rebuild_presence  # noqa: E402
+
+STUDENTS = 500
+SEMESTERS = [str(s) for s in range(1, 7)]
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    today = calendar.day_name[datetime.now().weekday()]
+    for sem in SEMESTERS:
+        db.session.add(Timetable(day=today, start_time='00:00', end_time='23:59',
+                                 subject=f'Lab Subject {sem}', lab_name='Lab 1', semester=sem))
+    for i in range(1, STUDENTS + 1):
+        db.session.add(Student(name=f'Student {i}', roll_no=f'R{i:05d}',
+                               semester=SEMESTERS[i % len(SEMESTERS)], fingerprint_id=i))
+    db.session.commit()
+
+
+def reset_log():
+    db.session.query(Attendance).delete()
+    db.session.commit()
+    rebuild_presence()
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    random.seed(11)
+    base = datetime.now().replace(hour=0, minute=1)
+    scans = [
+        {'scan_id': uuid.uuid4().hex, 'fingerprint_id': random.randint(1, STUDENTS),
+         'timestamp': (base + timedelta(seconds=i)).isoformat()}
+        for i in range(total)
+    ]
+    client = app.test_client()
+
+    with app.app_context():
+        seed()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for scan in scans:
+            client.post('/api/scan', json={'fingerprint_id': scan['fingerprint_id']})
+        single = time.perf_counter() - start
+
+    with app.app_context():
+        reset_log()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for i in range(0, total, batch_size):
+            response = client.post('/api/scan_batch', json={'scans': scans[i:i + batch_size]})
+            assert response.status_code == 200
+        batched = time.perf_counter() - start
+
+    print(f"single  {total} scans in {single:6.2f} s ({total / single:7.0f} scans/s)")
+    print(f"batch   {total} scans in {batched:6.2f} s ({total / batched:7.0f} scans/s, batch={batch_size})")
+    print(f"speedup {single / batched:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Load script: p50/p99 latency of POST /api/scan through the Flask test client.
+
+Run from the project root:
+    python benchmarks/bench_scan_latency.py [scans]
+"""
+import calendar
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app, db  # noqa: E402
+from database import Student, Timetable  # noqa: E402
+
+STUDENTS = 500
+SEMESTERS = [str(s) for s in range(1, 7)]
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    today = calendar.day_name[datetime.now().weekday()]
+    for sem in SEMESTERS:
+        db.session.add(Timetable(day=today, start_time='00:00', end_time='23:59',
+                                 subject=f'Lab Subject {sem}', lab_name='Lab 1', semester=sem))
+    for i in range(1, STUDENTS + 1):
+        db.session.add(Student(name=f'Student {i}', roll_no=f'R{i:05d}',
+                               semester=SEMESTERS[i % len(SEMESTERS)], fingerprint_id=i))
+    db.session.commit()
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    scans = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(7)
+    with app.app_context():
+        seed()
+
+    client = app.test_client()
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(scans):
+            payload = {'fingerprint_id': random.randint(1, STUDENTS)}
+            start = time.perf_counter()
+            response = client.post('/api/scan', json=payload)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+    latencies.sort()
+    total = sum(latencies)
+    print(f"{scans} scans in {total:.2f} s ({scans / total:.0f} scans/s)")
+    print(f"p50 {percentile(latencies, 50) * 1000:.2f} ms  "
+          f"p90 {percentile(latencies, 90) * 1000:.2f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
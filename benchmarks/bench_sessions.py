@@ -0,0 +1,74 @@
+"""Session pairing throughput: one vectorized pass vs. a per-row Python loop.
+
+Events come from the attendance engine's replay, so they contain the switch
+and break auto-logouts /api/scan writes.
+
+Run from the project root:
+    python benchmarks/bench_sessions.py [scans]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_engine import replay_frame  # noqa: E402
+from bench_attendance_engine import make_scans  # noqa: E402
+from sessions import pair_sessions  # noqa: E402
+
+
+def make_events(count):
+    events = replay_frame(make_scans(count))
+    events = events.rename(columns={'scan': 'id'})
+    events['id'] = np.arange(len(events)) # Insertion order, like Attendance.id
+    events['name'] = 'Student ' + events['student_id'].astype(str)
+    events['roll_no'] = 'R' + events['student_id'].astype(str)
+    events['semester'] = '3'
+    return events
+
+
+def pair_loop(events):
+    """Reference: walk each student's rows and close the open LOGIN on its LOGOUT."""
+    rows = []
+    open_login = {}
+    ordered = events.sort_values(['student_id', 'timestamp', 'id'], kind='stable')
+    for student_id, subject, status, timestamp in zip(
+            ordered['student_id'], ordered['subject'], ordered['status'], ordered['timestamp']):
+        pending = open_login.pop(student_id, None)
+        if pending is not None:
+            closed = status == 'LOGOUT' and subject == pending[0]
+            rows.append((student_id, pending[0], pending[1], timestamp if closed else pd.NaT))
+        if status == 'LOGIN':
+            open_login[student_id] = (subject, timestamp)
+    rows.extend((student_id, subject, timestamp, pd.NaT) for student_id, (subject, timestamp) in open_login.items())
+    return pd.DataFrame(rows, columns=['student_id', 'subject', 'login', 'logout'])
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    events = make_events(count)
+
+    sessions, vec_time = timed(pair_sessions, events)
+    print(f"vectorized {len(events)} events -> {len(sessions)} sessions in {vec_time:6.2f} s")
+
+    loop, loop_time = timed(pair_loop, events)
+    print(f"loop       {len(events)} events -> {len(loop)} sessions in {loop_time:6.2f} s")
+
+    key = ['student_id', 'login', 'subject']
+    left = sessions[key + ['logout']].sort_values(key, kind='stable').reset_index(drop=True)
+    right = loop[key + ['logout']].sort_values(key, kind='stable').reset_index(drop=True)
+    assert left.astype(str).equals(right.astype(str)), "vectorized pairing diverged from the loop"
+    print(f"speedup    ~{loop_time / vec_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
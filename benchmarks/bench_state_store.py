@@ -0,0 +1,98 @@
+"""Shared state store across N worker processes.
+
+1. Atomicity: every worker increments one counter with update(); the final
+   value must equal workers x increments (no lost updates).
+2. App throughput: every worker imports the app with STATE_BACKEND=sqlite and
+   drives heartbeat / LCD / registration-status requests through its own test
+   client, the way separate gunicorn workers would share one state file.
+
+Run from the project root:
+    python benchmarks/bench_state_store.py [max_workers] [seconds]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from state_store import SQLiteStateStore  # noqa: E402
+
+INCREMENTS = 500
+
+
+def count_worker(path, increments):
+    store = SQLiteStateStore(path)
+    for _ in range(increments):
+        store.update('counter', lambda old: (old or 0) + 1)
+
+
+def app_worker(worker, seconds, results):
+    sys.path.insert(0, ROOT)
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    client = app.test_client()
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        client.post('/api/heartbeat')
+        client.post('/api/lcd_status', json={'message': f'worker {worker} #{done}'})
+        client.get('/api/registration_status')
+        done += 3
+    results.put(done)
+
+
+def run_counter(workers, directory):
+    path = os.path.join(directory, f'counter_{workers}.db')
+    SQLiteStateStore(path) # Create the table before the workers race for it
+    procs = [multiprocessing.Process(target=count_worker, args=(path, INCREMENTS)) for _ in range(workers)]
+    began = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - began
+    final = SQLiteStateStore(path).get('counter')
+    expected = workers * INCREMENTS
+    assert final == expected, f"lost updates: {final} != {expected}"
+    print(f"  {workers} workers: {expected} atomic updates in {elapsed:5.2f} s "
+          f"({expected / elapsed:7.0f}/s), counter={final}")
+
+
+def run_app(workers, seconds, directory):
+    os.environ['STATE_BACKEND'] = 'sqlite'
+    os.environ['STATE_DB_PATH'] = os.path.join(directory, f'app_state_{workers}.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'app.db')
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=app_worker, args=(i, seconds, results)) for i in range(workers)]
+    for proc in procs:
+        proc.start()
+    total = sum(results.get() for _ in procs)
+    for proc in procs:
+        proc.join()
+    lcd = SQLiteStateStore(os.environ['STATE_DB_PATH']).get('lcd_message')
+    print(f"  {workers} workers: {total / seconds:7.0f} requests/s (shared LCD text: {lcd!r})")
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    counts = [n for n in (1, 2, 4, 8, 16) if n <= max_workers]
+    directory = tempfile.mkdtemp()
+
+    print("atomic counter (SQLiteStateStore.update)")
+    for workers in counts:
+        run_counter(workers, directory)
+
+    print(f"app state endpoints, {seconds:.0f} s per run")
+    for workers in counts:
+        run_app(workers, seconds, directory)
+
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('spawn')
+    main()
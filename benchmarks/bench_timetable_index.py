@@ -0,0 +1,84 @@
+"""Micro-benchmark: timetable lookup via SQL query vs. the in-memory index.
+
+Run from the project root:
+    python benchmarks/bench_timetable_index.py
+"""
+import calendar
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app, db  # noqa: E402
+from database import Timetable  # noqa: E402
+from timetable_index import timetable_index  # noqa: E402
+
+LOOKUPS = 5000
+SEMESTERS = [str(s) for s in range(1, 9)]
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    for day in list(calendar.day_name)[:6]:
+        for sem in SEMESTERS:
+            for hour in range(8, 17):
+                db.session.add(Timetable(
+                    day=day, start_time=f"{hour:02d}:00", end_time=f"{hour:02d}:50",
+                    subject=f"Subject {sem}-{hour}", lab_name=f"Lab {hour % 3}", semester=sem
+                ))
+    db.session.commit()
+    timetable_index.invalidate()
+
+
+def query_path(semester, now):
+    return Timetable.query.filter(
+        Timetable.day == calendar.day_name[now.weekday()],
+        Timetable.semester == semester,
+        Timetable.start_time <= now.strftime("%H:%M"),
+        Timetable.end_time >= now.strftime("%H:%M")
+    ).first()
+
+
+def index_path(semester, now):
+    return timetable_index.current_class(semester, now)
+
+
+def run(label, fn, samples):
+    start = time.perf_counter()
+    hits = 0
+    for semester, now in samples:
+        if fn(semester, now) is not None:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {LOOKUPS} lookups in {elapsed * 1000:8.1f} ms "
+          f"({elapsed / LOOKUPS * 1e6:7.1f} us/lookup, {hits} hits)")
+    return elapsed
+
+
+def main():
+    random.seed(42)
+    monday = datetime(2024, 1, 1)
+    samples = [
+        (random.choice(SEMESTERS), monday + timedelta(minutes=random.randrange(7 * 24 * 60)))
+        for _ in range(LOOKUPS)
+    ]
+    with app.app_context():
+        seed()
+        for semester, now in samples[:200]:
+            query_slot = query_path(semester, now)
+            index_slot = index_path(semester, now)
+            assert (query_slot.id if query_slot else None) == (index_slot.id if index_slot else None)
+
+        query_time = run('query', query_path, samples)
+        index_time = run('index', index_path, samples)
+        print(f"speedup  {query_time / index_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
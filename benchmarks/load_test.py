@@ -0,0 +1,167 @@
+"""Concurrent scan + dashboard load against a real server process.
+
+Starts the server on a scratch database, then runs scanner threads
+(POST /api/scan) and dashboard threads (GET /dashboard and
+/api/logs_since) side by side for a fixed time.
+
+    python benchmarks/load_test.py [--mode production|baseline|both] [--seconds 10]
+                                   [--scanners 8] [--readers 8]
+
+production: serve.py (waitress, pooled connections, WAL/busy_timeout pragmas)
+baseline:   Flask's threaded development server with SQLITE_TUNING=off
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STUDENTS = 500
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(database_url):
+    """Creates students and an all-day class in a fresh database (in a child process)."""
+    code = (
+        "import calendar\n"
+        "from datetime import datetime\n"
+        "from app import app, db, init_db\n"
+        "from database import Student, Timetable\n"
+        "init_db()\n"
+        "with app.app_context():\n"
+        "    today = calendar.day_name[datetime.now().weekday()]\n"
+        "    db.session.add(Timetable(day=today, start_time='00:00', end_time='23:59',\n"
+        "                             subject='Load Lab', lab_name='Lab 1', semester='1'))\n"
+        f"    db.session.add_all([Student(name=f'Student {{i}}', roll_no=f'R{{i:05d}}', semester='1',\n"
+        f"                                fingerprint_id=i) for i in range(1, {STUDENTS} + 1)])\n"
+        "    db.session.commit()\n"
+    )
+    env = dict(os.environ, DATABASE_URL=database_url)
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def start_server(mode, port, database_url, threads):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    if mode == 'production':
+        cmd = [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(port), '--threads', str(threads)]
+    else:
+        env['SQLITE_TUNING'] = 'off'
+        cmd = [sys.executable, '-c',
+               f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/lcd_status', timeout=1)
+            return proc
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, kind, elapsed, ok):
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(kind, []).append(elapsed)
+            else:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def scanner(base, stop, stats):
+    session = requests.Session()
+    while not stop.is_set():
+        began = time.perf_counter()
+        try:
+            r = session.post(f'{base}/api/scan', json={'fingerprint_id': random.randint(1, STUDENTS)}, timeout=30)
+            ok = r.status_code == 200 and r.json().get('status') == 'success'
+        except (requests.exceptions.RequestException, ValueError):
+            ok = False
+        stats.record('scan', time.perf_counter() - began, ok)
+
+
+def reader(base, stop, stats):
+    session = requests.Session()
+    urls = [('dashboard', f'{base}/dashboard'), ('logs_since', f'{base}/api/logs_since/0?limit=50')]
+    i = 0
+    while not stop.is_set():
+        kind, url = urls[i % len(urls)]
+        i += 1
+        began = time.perf_counter()
+        try:
+            ok = session.get(url, timeout=30).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        stats.record(kind, time.perf_counter() - began, ok)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else 0.0
+
+
+def run(mode, args):
+    directory = tempfile.mkdtemp()
+    database_url = 'sqlite:///' + os.path.join(directory, 'load.db')
+    seed(database_url)
+    port = free_port()
+    proc = start_server(mode, port, database_url, args.threads)
+    base = f'http://127.0.0.1:{port}'
+    stats = Stats()
+    stop = threading.Event()
+    workers = [threading.Thread(target=scanner, args=(base, stop, stats)) for _ in range(args.scanners)]
+    workers += [threading.Thread(target=reader, args=(base, stop, stats)) for _ in range(args.readers)]
+    try:
+        for worker in workers:
+            worker.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    print(f"{mode}: {args.scanners} scanners + {args.readers} readers for {args.seconds:.0f} s")
+    for kind in ('scan', 'dashboard', 'logs_since'):
+        latencies = stats.latencies.get(kind, [])
+        print(f"  {kind:<10} {len(latencies) / args.seconds:7.1f}/s  "
+              f"p50 {percentile(latencies, 0.5):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  "
+              f"errors {stats.errors.get(kind, 0)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent scan + dashboard load test')
+    parser.add_argument('--mode', choices=['production', 'baseline', 'both'], default='both')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--scanners', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+    random.seed(1)
+    for mode in (['baseline', 'production'] if args.mode == 'both' else [args.mode]):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Cross-worker invalidation for the in-process caches.
+
+The caches (student_cache, timetable_index, session_cache, report_cache)
+live in the process that built them, so invalidate() alone only reaches the
+worker that handled the write. With a shared state store (STATE_BACKEND=
+sqlite) each cache also keeps a generation counter in the store: invalidate()
+bumps it, and every lookup first compares it with the value this process last
+saw. A change means another worker wrote, and the whole local cache is
+dropped. With the per-process store there is nobody to tell, and both calls
+are no-ops.
+"""
+import threading
+
+
+class SharedGeneration:
+
+    def __init__(self, key):
+        self.key = key
+        self._state = None
+        self._seen = None
+        self._lock = threading.Lock()
+
+    def bind(self, state):
+        """Starts sharing through `state` (only if it is shared between processes)."""
+        if state.shared:
+            self._seen = state.get(self.key)
+            self._state = state
+
+    def bump(self):
+        """Tells the other workers this cache was invalidated.
+
+        Returns True when another worker had bumped since our last check;
+        that change is now counted as seen, so the caller must drop its whole
+        cache (not just the part it invalidated).
+        """
+        if self._state is None:
+            return False
+        old, new = self._state.update(self.key, lambda generation: (generation or 0) + 1)
+        with self._lock:
+            missed = old != self._seen
+            self._seen = new
+        return missed
+
+    def changed(self):
+        """True (once per change) when another worker invalidated since the last check."""
+        if self._state is None:
+            return False
+        current = self._state.get(self.key)
+        with self._lock:
+            if current == self._seen:
+                return False
+            self._seen = current
+            return True
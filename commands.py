@@ -0,0 +1,146 @@
+"""Device command dispatch with atomic claims, acknowledgements and retries.
+
+A Command row moves pending -> claimed -> done / failed:
+
+- claim_next() hands the oldest pending command addressed to a device (or to
+  any device) to exactly one caller: the claim is a conditional UPDATE on
+  status='pending', so two bridges or two workers racing for the same row
+  cannot both win.
+- The bridge acknowledges once the Arduino confirms (acknowledge()).
+- A claim that is not acknowledged within its type's timeout goes back to
+  pending and is delivered again, up to MAX_ATTEMPTS times.
+
+A device gets its next command only after the previous one was acknowledged
+or timed out, because the sensor works through commands one at a time.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, or_
+
+from database import db, Command
+
+# How long the device may take to confirm each command before it is resent
+ACK_TIMEOUTS = {
+    'REGISTER': timedelta(seconds=90), # Two finger placements plus the sensor's own timeouts
+    'DELETE': timedelta(seconds=15),
+    'EMPTY_DB': timedelta(seconds=30),
+    'LIST_IDS': timedelta(seconds=15), # Longer only if the sketch has to probe every slot
+}
+DEFAULT_ACK_TIMEOUT = timedelta(seconds=30)
+MAX_ATTEMPTS = 3
+
+
+class CommandNotifier:
+    """Wakes long-polling requests in this process as soon as a command is queued."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def generation(self):
+        with self._condition:
+            return self._generation
+
+    def wait(self, generation, timeout):
+        """Blocks until notify() is called after `generation` was read, or timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._generation != generation, timeout)
+
+
+command_notifier = CommandNotifier()
+
+
+def queue_command(type, payload=None, device_id=None):
+    """Adds a command to the session (the caller commits, then calls command_notifier.notify())."""
+    command = Command(type=type, payload=None if payload is None else str(payload), device_id=device_id)
+    db.session.add(command)
+    return command
+
+
+def queue_for_devices(type, payload, device_ids):
+    """Queues one copy per device (every sensor holds its own templates), or one
+    unaddressed command when no device has registered yet."""
+    device_ids = list(device_ids) or [None]
+    return [queue_command(type, payload, device_id) for device_id in device_ids]
+
+
+def expire_claims(now=None):
+    """Returns timed-out claims to pending, or fails them after MAX_ATTEMPTS. Returns the failed ids."""
+    now = now or datetime.now()
+    failed = []
+    stale = Command.query.filter(Command.status == 'claimed').all()
+    for command in stale:
+        if command.claimed_at + ACK_TIMEOUTS.get(command.type, DEFAULT_ACK_TIMEOUT) > now:
+            continue
+        target = 'failed' if command.attempts >= MAX_ATTEMPTS else 'pending'
+        # Conditional on the claim we saw, so a late ack always wins over the expiry
+        changed = db.session.execute(
+            update(Command)
+            .where(Command.id == command.id, Command.status == 'claimed', Command.claimed_at == command.claimed_at)
+            .values(status=target, result='No acknowledgement from device' if target == 'failed' else command.result,
+                    completed_at=now if target == 'failed' else None)
+        ).rowcount
+        if changed and target == 'failed':
+            failed.append(command.id)
+    return failed
+
+
+def claim_next(device_id, now=None):
+    """Atomically claims the next command for `device_id`. Returns the Command or None.
+
+    The caller commits.
+    """
+    now = now or datetime.now()
+    expire_claims(now)
+
+    busy = Command.query.filter(Command.status == 'claimed', Command.claimed_by == device_id).first()
+    if busy is not None:
+        return None # Still waiting for the device to confirm the previous command
+
+    while True:
+        candidate = Command.query.filter(
+            Command.status == 'pending',
+            or_(Command.device_id.is_(None), Command.device_id == device_id)
+        ).order_by(Command.created_at, Command.id).first()
+        if candidate is None:
+            return None
+        claimed = db.session.execute(
+            update(Command)
+            .where(Command.id == candidate.id, Command.status == 'pending')
+            .values(status='claimed', claimed_by=device_id, claimed_at=now, attempts=Command.attempts + 1)
+        ).rowcount
+        if claimed:
+            db.session.refresh(candidate)
+            return candidate
+        # Another claimer won this row; try the next one
+
+
+def acknowledge(command_id, device_id, ok=True, result=None, now=None):
+    """Marks a claimed command done/failed. Returns False if `device_id` does not hold the claim.
+
+    The caller commits.
+    """
+    changed = db.session.execute(
+        update(Command)
+        .where(Command.id == command_id, Command.status == 'claimed', Command.claimed_by == device_id)
+        .values(status='done' if ok else 'failed', completed_at=now or datetime.now(),
+                result=(result or '')[:200] or None)
+    ).rowcount
+    return bool(changed)
+
+
+def command_payload(command):
+    """JSON shape sent to the bridge (`id` stays the DELETE fingerprint id, as before)."""
+    return {
+        'command_id': command.id,
+        'device_id': command.claimed_by,
+        'type': command.type,
+        'id': int(command.payload) if command.payload else None,
+        'attempt': command.attempts,
+    }
@@ -1,10 +1,36 @@
+import os
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Applied to every new SQLite connection. WAL lets dashboard reads run while a
+# scan is writing, busy_timeout makes a writer wait for the lock instead of
+# failing with "database is locked", and NORMAL sync is safe under WAL.
+# SQLITE_TUNING=off keeps SQLite's defaults (for comparison runs).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    if os.environ.get('SQLITE_TUNING', 'on').lower() in ('0', 'off', 'false'):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 class Admin(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -22,6 +48,8 @@ class Student(db.Model):
     roll_no = db.Column(db.String(20), unique=True, nullable=False)
     semester = db.Column(db.String(10), nullable=False, default="1") # Added Semantic
     fingerprint_id = db.Column(db.Integer, unique=True, nullable=False)
+    # False until a finger is enrolled in the fingerprint_id slot (bulk imports with allocated ids)
+    enrolled = db.Column(db.Boolean, nullable=False, default=True, server_default='1')
     
     def __repr__(self):
         return f'<Student {self.name}>'
@@ -35,6 +63,13 @@ class Attendance(db.Model):
     
     student = db.relationship('Student', backref=db.backref('attendance_records', lazy=True, cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        db.Index('ix_attendance_student_timestamp', 'student_id', 'timestamp'), # Last log per student
+        db.Index('ix_attendance_timestamp', 'timestamp'), # Date ranges, dashboard ordering
+        # Ids never go back after a purge or reset; live dashboards page on id
+        {'sqlite_autoincrement': True},
+    )
+
 class Timetable(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     day = db.Column(db.String(10), nullable=False) # Monday, Tuesday...
@@ -44,8 +79,53 @@ class Timetable(db.Model):
     lab_name = db.Column(db.String(100), nullable=False)
     semester = db.Column(db.String(10), nullable=False, default="1")
 
+    __table_args__ = (
+        db.Index('ix_timetable_day_semester_start', 'day', 'semester', 'start_time'),
+    )
+
 class Command(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(20), nullable=False) # REGISTER, DELETE
     payload = db.Column(db.String(100), nullable=True) # JSON payload or simple ID string
     created_at = db.Column(db.DateTime, default=datetime.now)
+    # Dispatch state (see commands.py): pending -> claimed -> done / failed
+    device_id = db.Column(db.String(64), nullable=True) # None: any device may take it
+    status = db.Column(db.String(20), nullable=False, default='pending', server_default='pending')
+    claimed_by = db.Column(db.String(64), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.String(200), nullable=True) # Device reply, e.g. "Deleted!"
+
+    __table_args__ = (
+        db.Index('ix_command_status_created', 'status', 'created_at'),
+    )
+
+class StudentPresence(db.Model):
+    # One row per student, mirroring the latest Attendance row (kept in sync by api_scan)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    status = db.Column(db.String(20), nullable=False) # LOGIN or LOGOUT
+    subject = db.Column(db.String(100), nullable=False)
+    lab_name = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    student = db.relationship('Student', backref=db.backref('presence', uselist=False, lazy=True, cascade="all, delete-orphan"))
+
+    __table_args__ = (
+        db.Index('ix_presence_status_updated', 'status', 'updated_at'),
+        db.Index('ix_presence_lab_status', 'lab_name', 'status'),
+    )
+
+class ScanReceipt(db.Model):
+    # Idempotency record for scans replayed from a bridge's offline journal
+    scan_id = db.Column(db.String(64), primary_key=True) # Client-generated (UUID)
+    result = db.Column(db.Text, nullable=False) # JSON response returned for this scan
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+class AttendanceRollup(db.Model):
+    # Pre-aggregated Attendance counts per day x semester x subject x status (analytics)
+    day = db.Column(db.Date, primary_key=True)
+    semester = db.Column(db.String(10), primary_key=True) # Student's (current) semester
+    subject = db.Column(db.String(100), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
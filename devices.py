@@ -0,0 +1,89 @@
+"""Per-device state (heartbeat, LCD text, registration) for several scanners and labs.
+
+Everything lives in the app's state store, one key per device and field, so
+heartbeats from dozens of scanners never contend on a single value and
+several worker processes see the same devices. The global keys the
+dashboards already read ('last_heartbeat_time', 'lcd_message',
+'registration_status') keep reflecting the most recent device.
+"""
+import time
+
+DEFAULT_DEVICE = 'default' # Bridges that don't send a device_id
+HEARTBEAT_FRESH_SECONDS = 5
+
+
+def heartbeat_is_fresh(last_heartbeat_time):
+    return (time.time() - (last_heartbeat_time or 0)) < HEARTBEAT_FRESH_SECONDS
+
+
+class DeviceRegistry:
+
+    def __init__(self, state):
+        self.state = state
+
+    def known(self):
+        """{device_id: {'lab_name': ...}} for every device that has sent a heartbeat."""
+        return self.state.get('devices') or {}
+
+    def lab_of(self, device_id, known=None):
+        """Lab a device is installed in (None: unknown, matches any lab)."""
+        known = self.known() if known is None else known
+        return (known.get(device_id) or {}).get('lab_name')
+
+    def heartbeat(self, device_id, lab_name=None):
+        """Records a heartbeat. Returns True if this device was offline before."""
+        now = time.time()
+        previous, _ = self.state.update(f'heartbeat:{device_id}', lambda _: now)
+        self.state.set('last_heartbeat_time', now)
+        if self.known().get(device_id) != {'lab_name': lab_name}:
+            self.state.update('devices', lambda known: dict(known or {}, **{device_id: {'lab_name': lab_name}}))
+        return not heartbeat_is_fresh(previous)
+
+    def any_connected(self):
+        return heartbeat_is_fresh(self.state.get('last_heartbeat_time'))
+
+    def set_lcd(self, device_id, message):
+        self.state.set(f'lcd:{device_id}', message)
+        self.state.set('lcd_message', message)
+
+    def set_registration(self, device_id, status):
+        if device_id:
+            self.state.set(f'registration:{device_id}', status)
+        self.state.set('registration_status', status)
+
+    def registration(self, device_id=None):
+        if device_id:
+            return self.state.get(f'registration:{device_id}') or self.state.get('registration_status')
+        return self.state.get('registration_status')
+
+    def connected_ids(self):
+        known = self.known()
+        heartbeats = self.state.get_many([f'heartbeat:{device_id}' for device_id in known]) if known else {}
+        return [device_id for device_id in known if heartbeat_is_fresh(heartbeats[f'heartbeat:{device_id}'])]
+
+    def target_device(self, requested=None):
+        """The scanner a command goes to: `requested`, else the only one online, else None (any scanner)."""
+        if requested:
+            return requested
+        online = self.connected_ids()
+        return online[0] if len(online) == 1 else None
+
+    def describe(self):
+        """One dict per known device for /api/devices."""
+        known = self.known()
+        keys = []
+        for device_id in known:
+            keys += [f'heartbeat:{device_id}', f'lcd:{device_id}', f'registration:{device_id}']
+        values = self.state.get_many(keys) if keys else {}
+        devices = []
+        for device_id, info in sorted(known.items()):
+            last = values[f'heartbeat:{device_id}'] or 0
+            devices.append({
+                'device_id': device_id,
+                'lab_name': info.get('lab_name'),
+                'connected': heartbeat_is_fresh(last),
+                'last_heartbeat': last,
+                'lcd_message': values[f'lcd:{device_id}'],
+                'registration': values[f'registration:{device_id}'],
+            })
+        return devices
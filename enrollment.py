@@ -0,0 +1,188 @@
+"""Batched fingerprint enrollment: one REGISTER after another for a list of students.
+
+The session lives in the state store under 'enrollment' (so every worker
+sees it) and walks its students in order. Each REGISTER the sensor
+completes (REG_SUCCESS:<slot>) is bound to the student whose turn it is,
+and the next REGISTER is queued in the same request, so the sensor is
+never idle waiting for the admin. A failed enrollment is retried
+ENROLL_ATTEMPTS times, then that student is marked failed and the session
+moves on.
+
+Methods that queue commands or bind fingerprints leave the changes in the
+DB session; the caller commits, then calls command_notifier.notify().
+"""
+from datetime import datetime
+
+from database import db, Student, Command
+from commands import queue_command
+
+ENROLL_ATTEMPTS = 2
+IDLE_SESSION = {'active': False, 'device_id': None, 'order': [], 'position': 0, 'command_id': None, 'students': {}}
+
+
+def bind_fingerprint(student_id, fingerprint_id):
+    """Gives `student_id` the sensor slot it was just enrolled in.
+
+    A student already holding that slot cannot have a template there (the
+    sensor only enrolls into free slots), so it swaps ids with this student
+    and goes back to not enrolled. Returns that student, or None.
+    """
+    student = db.session.get(Student, student_id)
+    holder = Student.query.filter(Student.fingerprint_id == fingerprint_id, Student.id != student_id).first()
+    if holder is not None:
+        previous = student.fingerprint_id
+        holder.fingerprint_id = -holder.id # Parked so the unique constraint holds mid-swap
+        db.session.flush()
+        student.fingerprint_id = fingerprint_id
+        db.session.flush()
+        holder.fingerprint_id = previous
+        holder.enrolled = False
+    else:
+        student.fingerprint_id = fingerprint_id
+    student.enrolled = True
+    return holder
+
+
+class EnrollmentSession:
+
+    def __init__(self, state):
+        self.state = state
+
+    def status(self):
+        """The session with per-student progress and totals."""
+        session = self.state.get('enrollment') or dict(IDLE_SESSION)
+        counts = {}
+        for entry in session['students'].values():
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        current = session['order'][session['position']] if session['active'] else None
+        return dict(session, current=current, counts=counts, total=len(session['order']),
+                    students=[dict(session['students'][str(student_id)], student_id=student_id)
+                              for student_id in session['order']])
+
+    def start(self, students, device_id=None):
+        """Starts enrolling `students` (Student rows, in order) on `device_id`.
+
+        Returns the new session, or None if one is already running.
+        """
+        def begin(current):
+            if current and current['active']:
+                return current
+            session = {
+                'active': bool(students),
+                'device_id': device_id,
+                'order': [student.id for student in students],
+                'position': 0,
+                'command_id': None,
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'students': {
+                    str(student.id): {'name': student.name, 'roll_no': student.roll_no, 'status': 'waiting',
+                                      'fingerprint_id': None, 'attempts': 0, 'message': ''}
+                    for student in students
+                },
+            }
+            if students:
+                session['students'][str(students[0].id)]['status'] = 'enrolling'
+                session['command_id'] = self._queue_register(device_id)
+            started.append(session)
+            return session
+
+        started = []
+        self.state.update('enrollment', begin)
+        return started[0] if started else None
+
+    # The methods below change the session inside state.update(), so two
+    # workers handling results at once cannot overwrite each other's progress
+
+    def on_result(self, device_id, ok, fingerprint_id=None, message=None):
+        """Applies a registration result. Returns False if no session is waiting on this device."""
+        def apply(session):
+            if not session or not session['active'] or (session['device_id'] or device_id) != device_id:
+                return session
+            student_id = session['order'][session['position']]
+            entry = session['students'][str(student_id)]
+            entry['attempts'] += 1
+            session['command_id'] = None # The sensor has finished that REGISTER
+
+            if ok and fingerprint_id is not None:
+                swapped = bind_fingerprint(student_id, int(fingerprint_id))
+                entry.update(status='enrolled', fingerprint_id=int(fingerprint_id), message='')
+                if swapped is not None:
+                    entry['message'] = f'Slot {fingerprint_id} was assigned to {swapped.roll_no}; their ids were swapped'
+                    if str(swapped.id) in session['students']:
+                        session['students'][str(swapped.id)].update(status='waiting', fingerprint_id=None)
+                self._advance(session)
+            elif entry['attempts'] >= ENROLL_ATTEMPTS:
+                entry.update(status='failed', message=message or 'Device failed to enroll')
+                self._advance(session)
+            else:
+                entry['message'] = f"{message or 'Device failed to enroll'}; retrying"
+                session['command_id'] = self._queue_register(session['device_id'])
+            applied.append(True)
+            return session
+
+        applied = []
+        self.state.update('enrollment', apply)
+        return bool(applied)
+
+    def check_command(self):
+        """Treats a REGISTER the device never confirmed (failed after its retries) as a failed attempt."""
+        session = self.state.get('enrollment')
+        if not session or not session['active'] or session['command_id'] is None:
+            return False
+        command = db.session.get(Command, session['command_id'])
+        if command is None or command.status != 'failed':
+            return False
+        return self.on_result(session['device_id'], False, message=command.result or 'No response from device')
+
+    def skip(self):
+        """Skips the current student (e.g. absent); their REGISTER, if still running, goes to the next one."""
+        def apply(session):
+            if not session or not session['active']:
+                return session
+            entry = session['students'][str(session['order'][session['position']])]
+            entry.update(status='skipped', message='Skipped')
+            self._advance(session)
+            applied.append(True)
+            return session
+
+        applied = []
+        self.state.update('enrollment', apply)
+        return bool(applied)
+
+    def cancel(self):
+        def apply(session):
+            if not session or not session['active']:
+                return session
+            for entry in session['students'].values():
+                if entry['status'] in ('waiting', 'enrolling'):
+                    entry.update(status='cancelled')
+            session['active'] = False
+            applied.append(True)
+            return session
+
+        applied = []
+        self.state.update('enrollment', apply)
+        return bool(applied)
+
+    def _advance(self, session):
+        """Moves to the next waiting student and makes sure a REGISTER is on its way."""
+        for position in range(len(session['order'])):
+            entry = session['students'][str(session['order'][position])]
+            if entry['status'] == 'waiting':
+                session['position'] = position
+                entry['status'] = 'enrolling'
+                if not self._outstanding(session['command_id']):
+                    session['command_id'] = self._queue_register(session['device_id'])
+                return
+        session['active'] = False
+
+    def _outstanding(self, command_id):
+        if command_id is None:
+            return False
+        command = db.session.get(Command, command_id)
+        return command is not None and command.status in ('pending', 'claimed')
+
+    def _queue_register(self, device_id):
+        command = queue_command('REGISTER', device_id=device_id)
+        db.session.flush() # Assigns the id the session tracks
+        return command.id
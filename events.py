@@ -0,0 +1,100 @@
+import json
+import os
+import queue
+import threading
+import time
+
+KEEPALIVE_SECONDS = 15
+DEVICE_CHECK_SECONDS = 1.0
+# Each open stream holds a server thread, so only this many may be open at
+# once per process; keep it well below serve.py's --threads
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 8))
+
+
+class EventBroker:
+    """In-process fan-out of server events to Server-Sent Events subscribers.
+
+    Each open /api/events stream owns a bounded queue; publish() never blocks
+    the caller (a scan or heartbeat) and drops events for a client that has
+    stopped reading instead of growing without limit. At most `max_streams`
+    subscribers exist at a time.
+    """
+
+    def __init__(self, max_queue=256, max_streams=SSE_MAX_STREAMS):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._max_queue = max_queue
+        self._max_streams = max_streams
+
+    def subscribe(self):
+        """A new subscriber queue, or None if max_streams are already open."""
+        q = queue.Queue(maxsize=self._max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self._max_streams:
+                return None
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event_type, data):
+        message = format_sse(event_type, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                pass # Slow client; it will resync on reconnect
+
+    def stream(self, q, initial_events, watch):
+        """Generator for one SSE response, fed by the subscriber queue `q`.
+
+        `initial_events` is a list of (event_type, data) sent first so a new
+        client starts from the current state. `watch` returns
+        {event_type: data} for state that can change without a publish() in
+        this process (a missed heartbeat, or another worker's LCD text or
+        attendance rows when the state store is shared). It is polled about
+        once a second and every entry that changed is sent as that event.
+        """
+        try:
+            yield "retry: 2000\n\n"
+            for event_type, data in initial_events:
+                yield format_sse(event_type, data)
+
+            seen = watch()
+            next_check = time.monotonic() + DEVICE_CHECK_SECONDS
+            last_sent = time.monotonic()
+            while True:
+                try:
+                    message = q.get(timeout=max(next_check - time.monotonic(), 0))
+                    yield message
+                    last_sent = time.monotonic()
+                    # Already announced by the publisher; don't resend it from the poll
+                    event_type = message.split('\n', 1)[0][len('event: '):]
+                    if event_type in seen:
+                        seen[event_type] = watch()[event_type]
+                except queue.Empty:
+                    if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keepalive\n\n"
+
+                if time.monotonic() < next_check:
+                    continue
+                next_check = time.monotonic() + DEVICE_CHECK_SECONDS
+                current = watch()
+                for event_type, data in current.items():
+                    if seen.get(event_type) != data:
+                        yield format_sse(event_type, data)
+                seen = current
+        finally:
+            self.unsubscribe(q)
+
+
+def format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+event_broker = EventBroker()
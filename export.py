@@ -0,0 +1,163 @@
+import csv
+import heapq
+import io
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+from openpyxl import Workbook
+import archive
+from database import db, Student, Attendance
+
+EXPORT_COLUMNS = ['Student Name', 'Register No', 'Semester', 'Subject', 'Date', 'Time', 'Status']
+REPORT_COLUMNS = ['Student Name', 'Register No', 'Semester', 'Subject', 'Scheduled', 'Attended', 'Attendance %']
+DURATION_COLUMNS = ['Student Name', 'Register No', 'Semester', 'Subject', 'Date', 'Login', 'Logout', 'Minutes']
+CHUNK_SIZE = 1000
+ExportRow = namedtuple('ExportRow', ['id', 'name', 'roll_no', 'semester', 'subject', 'timestamp', 'status'])
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None # Ignore missing/invalid dates
+
+
+def attendance_export_query(date_from=None, date_to=None, semester=None, subject=None):
+    """Joined attendance rows for export, filtered and streamed in chunks.
+
+    Dates are 'YYYY-MM-DD' strings (inclusive); invalid values are ignored
+    the same way the dashboard filter ignores them. Archived rows are merged
+    in, so the result stays in (timestamp, id) order across both.
+    """
+    query = db.session.query(
+        Attendance.id,
+        Student.name,
+        Student.roll_no,
+        Student.semester,
+        Attendance.subject,
+        Attendance.timestamp,
+        Attendance.status
+    ).join(Attendance, Student.id == Attendance.student_id)
+
+    start = _parse_date(date_from)
+    if start:
+        query = query.filter(Attendance.timestamp >= start)
+    end = _parse_date(date_to)
+    if end:
+        end += timedelta(days=1)
+        query = query.filter(Attendance.timestamp < end)
+    if semester:
+        query = query.filter(Student.semester == semester)
+    if subject:
+        query = query.filter(Attendance.subject.ilike(f"%{subject}%"))
+
+    query = query.order_by(Attendance.timestamp, Attendance.id).yield_per(CHUNK_SIZE)
+    if not archive.archived_years():
+        return query
+    archived = _archived_export_rows(start, end, semester, subject)
+    return heapq.merge(archived, query, key=lambda row: (row.timestamp, row.id))
+
+
+def _archived_export_rows(start, end, semester, subject):
+    students = {row.id: row for row in db.session.query(Student.id, Student.name, Student.roll_no, Student.semester)}
+    for row_id, student_id, timestamp, status, row_subject in archive.iter_rows(start, end, subject):
+        student = students.get(student_id)
+        if student is None or (semester and student.semester != semester):
+            continue
+        yield ExportRow(row_id, student.name, student.roll_no, student.semester, row_subject, timestamp, status)
+
+
+def iter_export_rows(query):
+    """Yields one list of cell values per attendance row."""
+    for row in query:
+        yield [
+            row.name,
+            row.roll_no,
+            row.semester,
+            row.subject,
+            row.timestamp.strftime('%Y-%m-%d'),
+            row.timestamp.strftime('%H:%M:%S'),
+            row.status
+        ]
+
+
+def stream_csv(query):
+    """Yields the export as CSV text, one chunk per CHUNK_SIZE rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(iter_export_rows(query), start=1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_duration_rows(sessions):
+    """Yields one list of cell values per paired session (open sessions have no logout)."""
+    for row in sessions.itertuples(index=False):
+        yield [
+            row.name,
+            row.roll_no,
+            row.semester,
+            row.subject,
+            row.login.strftime('%Y-%m-%d'),
+            row.login.strftime('%H:%M:%S'),
+            row.logout.strftime('%H:%M:%S') if row.closed else '',
+            round(row.minutes, 1) if row.closed else None
+        ]
+
+
+def write_xlsx(query, path, sessions=None, report=None):
+    """Writes the export to `path` with openpyxl's write-only (constant memory) mode.
+
+    `sessions` (session frames from sessions.py, e.g. one per day) adds a
+    'Durations' sheet and `report` (from attendance_report.py) an
+    'Attendance %' sheet.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Attendance')
+    sheet.append(EXPORT_COLUMNS)
+    for row in iter_export_rows(query):
+        sheet.append(row)
+    if sessions is not None:
+        sheet = workbook.create_sheet('Durations')
+        sheet.append(DURATION_COLUMNS)
+        for frame in sessions:
+            for row in iter_duration_rows(frame):
+                sheet.append(row)
+    if report is not None:
+        sheet = workbook.create_sheet('Attendance %')
+        sheet.append(REPORT_COLUMNS)
+        for row in report.itertuples(index=False):
+            sheet.append([row.name, row.roll_no, row.semester, row.subject,
+                          int(row.scheduled), int(row.attended), float(row.percent)])
+    workbook.save(path)
+
+
+def build_xlsx_file(query, sessions=None, report=None):
+    """Writes the export to a temporary .xlsx file and returns its path."""
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_xlsx(query, path, sessions, report)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def stream_file_and_remove(path, chunk_size=64 * 1024):
+    """Yields a file in chunks, deleting it once fully sent (or on disconnect)."""
+    try:
+        with open(path, 'rb') as handle:
+            while True:
+                chunk = handle.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
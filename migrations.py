@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text, func, or_
+from database import db, Student, Attendance, Timetable, Command, StudentPresence
+
+
+def upgrade_schema():
+    """Brings an existing database up to the current models.
+
+    create_all() only creates missing tables, so columns and indexes added to
+    tables that already exist are created here (ALTER TABLE ADD COLUMN, then
+    CREATE INDEX IF NOT EXISTS semantics). New columns on existing tables
+    must be nullable or have a server_default.
+    Returns the names of the columns ("table.column") and indexes created.
+    """
+    db.create_all()
+    created = []
+    engine = db.engine
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in db.inspect(engine).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+                with engine.begin() as conn:
+                    conn.execute(text(ddl))
+                created.append(f'{table.name}.{column.name}')
+
+        existing = {index['name'] for index in db.inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine, checkfirst=True)
+                created.append(index.name)
+
+        if table.kwargs.get('sqlite_autoincrement') and not _has_autoincrement(engine, table.name):
+            _rebuild_table(engine, table)
+            created.append(f'{table.name} AUTOINCREMENT')
+    return created
+
+
+def _has_autoincrement(engine, name):
+    with engine.connect() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {'name': name}).scalar()
+    return sql is None or 'AUTOINCREMENT' in sql.upper()
+
+
+def _rebuild_table(engine, table):
+    """Recreates `table` from the model, keeping its rows (SQLite cannot ALTER a primary key)."""
+    old = f'_{table.name}_old'
+    columns = ', '.join(column.name for column in table.columns)
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table.name} RENAME TO {old}'))
+        for index in table.indexes:
+            conn.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+        table.create(bind=conn)
+        conn.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old}'))
+        conn.execute(text(f'DROP TABLE {old}'))
+
+
+def _hot_queries():
+    """(label, query) pairs for the query shapes used on hot paths."""
+    now = datetime.now()
+    day_start = datetime.combine(now.date(), datetime.min.time())
+    return [
+        ('last log per student (api_scan)',
+         Attendance.query.filter_by(student_id=1).order_by(Attendance.timestamp.desc()).limit(1)),
+        ('active count (presence)',
+         db.session.query(func.count(StudentPresence.student_id))
+         .filter(StudentPresence.status == 'LOGIN', StudentPresence.updated_at >= day_start)),
+        ('dashboard date range',
+         Attendance.query.join(Student).filter(Attendance.timestamp.between(day_start, now))
+         .order_by(Attendance.timestamp.desc())),
+        ('dashboard keyset page',
+         Attendance.query.join(Student).filter(or_(
+             Attendance.timestamp < now, (Attendance.timestamp == now) & (Attendance.id < 100)
+         )).order_by(Attendance.timestamp.desc(), Attendance.id.desc()).limit(51)),
+        ('daily stats (last 7 days)',
+         db.session.query(func.date(Attendance.timestamp).label('date'), func.count(Attendance.id))
+         .filter(Attendance.timestamp >= day_start - timedelta(days=6)).group_by('date')),
+        ('next command (dispatcher)',
+         Command.query.filter(Command.status == 'pending').order_by(Command.created_at, Command.id).limit(1)),
+        ('current class (timetable)',
+         Timetable.query.filter(Timetable.day == 'Monday', Timetable.semester == '1',
+                                Timetable.start_time <= '09:30', Timetable.end_time >= '09:30')),
+    ]
+
+
+def explain(query):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a SQLAlchemy query."""
+    statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    return [row[-1] for row in rows]
+
+
+FULL_SCAN_PREFIXES = ('SCAN attendance', 'SCAN timetable', 'SCAN command', 'SCAN student_presence')
+
+
+def check_query_plans():
+    """EXPLAIN QUERY PLAN for every hot query.
+
+    Returns (label, plan_lines, ok) tuples; ok is False when the plan scans
+    attendance, timetable, command or student_presence from end to end,
+    including a SCAN ... USING (COVERING) INDEX, which still reads every entry.
+    """
+    report = []
+    for label, query in _hot_queries():
+        plan = explain(query)
+        full_scans = [line for line in plan if line.startswith(FULL_SCAN_PREFIXES)]
+        report.append((label, plan, not full_scans))
+    return report
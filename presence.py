@@ -0,0 +1,117 @@
+from datetime import datetime, date
+from sqlalchemy import func
+import archive
+from database import db, Student, Attendance, StudentPresence
+
+
+def _today_start():
+    return datetime.combine(date.today(), datetime.min.time())
+
+
+def record_presence(student_id, status, subject, lab_name=None, timestamp=None):
+    """Upserts the student's presence row. Caller commits (same transaction as the Attendance insert)."""
+    presence = db.session.get(StudentPresence, student_id)
+    if presence is None:
+        presence = StudentPresence(student_id=student_id)
+        db.session.add(presence)
+    presence.status = status
+    presence.subject = subject
+    presence.lab_name = lab_name
+    presence.updated_at = timestamp or datetime.now()
+    return presence
+
+
+def active_student_count():
+    """Students whose latest scan today is a LOGIN."""
+    return StudentPresence.query.filter(
+        StudentPresence.status == 'LOGIN',
+        StudentPresence.updated_at >= _today_start()
+    ).count()
+
+
+def students_in_lab(lab_name=None, subject=None):
+    """Students currently logged in today, optionally narrowed to a lab or subject."""
+    query = db.session.query(Student, StudentPresence).join(
+        StudentPresence, Student.id == StudentPresence.student_id
+    ).filter(
+        StudentPresence.status == 'LOGIN',
+        StudentPresence.updated_at >= _today_start()
+    )
+    if lab_name:
+        query = query.filter(StudentPresence.lab_name == lab_name)
+    if subject:
+        query = query.filter(StudentPresence.subject == subject)
+    return query.order_by(StudentPresence.updated_at.desc()).all()
+
+
+def refresh_presence(student_ids):
+    """Recomputes the presence rows of `student_ids` after some of their logs were purged. Caller commits.
+
+    A student whose latest scan survived keeps their row (and its lab).
+    """
+    student_ids = list(student_ids)
+    ranked = db.session.query(
+        Attendance.student_id,
+        Attendance.status,
+        Attendance.subject,
+        Attendance.timestamp,
+        func.row_number().over(
+            partition_by=Attendance.student_id,
+            order_by=(Attendance.timestamp.desc(), Attendance.id.desc())
+        ).label('rank')
+    ).filter(Attendance.student_id.in_(student_ids)).subquery()
+
+    wanted = set(student_ids)
+    latest = {student_id: row for student_id, row in archive.latest_per_student().items() if student_id in wanted}
+    for row in db.session.query(ranked).filter(ranked.c.rank == 1):
+        latest[row.student_id] = (row.status, row.subject, row.timestamp)
+
+    for presence in StudentPresence.query.filter(StudentPresence.student_id.in_(student_ids)).all():
+        row = latest.pop(presence.student_id, None)
+        if row is None:
+            db.session.delete(presence)
+        elif (presence.status, presence.subject, presence.updated_at) != row:
+            presence.status, presence.subject, presence.updated_at = row
+            presence.lab_name = None
+    for student_id, (status, subject, timestamp) in latest.items():
+        db.session.add(StudentPresence(student_id=student_id, status=status, subject=subject,
+                                       lab_name=None, updated_at=timestamp))
+
+
+def rebuild_presence():
+    """Recomputes every presence row from the Attendance log (recovery path).
+
+    The log does not record the lab, so rebuilt rows carry lab_name=None
+    until the student's next scan. Students with no live rows fall back to
+    their newest archived row.
+    """
+    ranked = db.session.query(
+        Attendance.student_id,
+        Attendance.status,
+        Attendance.subject,
+        Attendance.timestamp,
+        func.row_number().over(
+            partition_by=Attendance.student_id,
+            order_by=(Attendance.timestamp.desc(), Attendance.id.desc())
+        ).label('rank')
+    ).subquery()
+
+    latest = archive.latest_per_student()
+    existing = {student_id for (student_id,) in db.session.query(Student.id)}
+    latest = {student_id: row for student_id, row in latest.items() if student_id in existing}
+    for row in db.session.query(ranked).filter(ranked.c.rank == 1):
+        latest[row.student_id] = (row.status, row.subject, row.timestamp)
+
+    db.session.query(StudentPresence).delete()
+    db.session.bulk_insert_mappings(StudentPresence, [
+        {
+            'student_id': student_id,
+            'status': status,
+            'subject': subject,
+            'lab_name': None,
+            'updated_at': timestamp or datetime.now(),
+        }
+        for student_id, (status, subject, timestamp) in latest.items()
+    ])
+    db.session.commit()
+    return len(latest)
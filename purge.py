@@ -0,0 +1,220 @@
+"""System reset and bulk purges as a background job with short transactions.
+
+A purge deletes attendance logs matching a date range and/or a semester;
+a reset ('all') deletes every student, log, timetable entry and scan
+receipt and wipes the scanners. Either way the job runs on its own thread and deletes
+PURGE_CHUNK_SIZE rows per transaction, pausing between chunks, so the
+SQLite write lock is only ever held briefly and live scans keep working.
+
+Each purge chunk subtracts its rows from the rollups in the same
+transaction. Presence is recomputed at the end for the students whose
+logs were purged, and archived rows (archive.py) are purged too.
+
+Optionally the job first snapshots the database with SQLite's online
+backup API, in one step: under WAL the copy reads a consistent snapshot
+while scans keep writing, whereas a stepped backup restarts after every
+write from another connection and might never finish.
+
+Progress lives in the state store under 'purge_job', so every worker can
+report it and only one job runs at a time.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import archive
+from attendance_report import report_cache
+from commands import queue_for_devices, command_notifier
+from database import db, Student, Attendance, Timetable, StudentPresence, AttendanceRollup, ScanReceipt
+from presence import refresh_presence
+from rollups import subtract_counts
+from sessions import session_cache
+from student_cache import student_cache
+from timetable_index import timetable_index
+
+logger = logging.getLogger(__name__)
+
+PURGE_CHUNK_SIZE = 1000
+CHUNK_PAUSE_SECONDS = 0.05 # Lets waiting scans take the write lock between chunks
+JOB_STALE_SECONDS = 300 # A running job that stopped reporting (its process died) may be replaced
+IDLE_JOB = {'active': False, 'status': 'idle'}
+
+
+def backup_dir():
+    """BACKUP_DIR, or a 'backups' folder next to the main database."""
+    return os.environ.get('BACKUP_DIR') or os.path.join(os.path.dirname(os.path.abspath(archive.main_db_path())), 'backups')
+
+
+def snapshot_database(progress=None):
+    """Copies the live database with sqlite3's online backup API in a single step. Returns the snapshot path."""
+    os.makedirs(backup_dir(), exist_ok=True)
+    path = os.path.join(backup_dir(), f"attendance_{datetime.now():%Y%m%d_%H%M%S}.db")
+    source = sqlite3.connect(archive.main_db_path(), timeout=30)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target, pages=-1,
+                      progress=lambda status, remaining, total: progress and progress(total - remaining, total))
+    finally:
+        target.close()
+        source.close()
+    return path
+
+
+class PurgeJob:
+
+    def __init__(self, state):
+        self.state = state
+
+    def status(self):
+        return self.state.get('purge_job') or dict(IDLE_JOB)
+
+    def start(self, app, scope, start=None, end=None, semester=None, snapshot=False, device_ids=()):
+        """Starts a job unless one is running. Returns (started, job).
+
+        scope is 'all' (system reset) or 'purge' (attendance logs with
+        start <= timestamp < end and/or of `semester`'s students).
+        """
+        now = time.time()
+        job = {
+            'active': True, 'status': 'running', 'scope': scope, 'phase': 'starting',
+            'filters': {'start': start.isoformat() if start else None, 'end': end.isoformat() if end else None,
+                        'semester': semester},
+            'snapshot': snapshot, 'snapshot_path': None, 'deleted': {}, 'message': '',
+            'started_at': datetime.now().isoformat(timespec='seconds'), 'finished_at': None, 'updated_at': now,
+        }
+
+        def claim(current):
+            running = current and current.get('active') and now - current.get('updated_at', 0) < JOB_STALE_SECONDS
+            return current if running else job
+
+        _, claimed = self.state.update('purge_job', claim)
+        if claimed != job:
+            return False, claimed
+        threading.Thread(target=self._run, args=(app, job, start, end, semester, list(device_ids)),
+                         name='purge-job', daemon=True).start()
+        return True, job
+
+    def _report(self, job, **changes):
+        job.update(changes, updated_at=time.time())
+        self.state.set('purge_job', job)
+
+    def _run(self, app, job, start, end, semester, device_ids):
+        with app.app_context():
+            try:
+                if job['snapshot']:
+                    self._report(job, phase='snapshot')
+                    job['snapshot_path'] = snapshot_database(
+                        lambda copied, total: self._report(job, phase=f'snapshot ({copied}/{total} pages)'))
+                if job['scope'] == 'all':
+                    self._reset(job, device_ids)
+                else:
+                    self._purge(job, start, end, semester)
+                self._report(job, active=False, status='done', phase='done',
+                             finished_at=datetime.now().isoformat(timespec='seconds'))
+                logger.info("Purge job (%s) finished: %s", job['scope'], job['deleted'])
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Purge job (%s) failed", job['scope'])
+                self._report(job, active=False, status='failed', message=str(e),
+                             finished_at=datetime.now().isoformat(timespec='seconds'))
+            finally:
+                db.session.remove()
+
+    def _delete_chunks(self, job, name, model, key, *conditions, on_chunk=None):
+        """Deletes matching rows PURGE_CHUNK_SIZE primary keys per transaction."""
+        job['deleted'].setdefault(name, 0)
+        self._report(job, phase=f'deleting {name}')
+        last = None
+        while True:
+            # Keyset on the primary key: each chunk starts where the previous one ended
+            query = db.session.query(key).filter(*conditions)
+            if last is not None:
+                query = query.filter(key > last)
+            keys = [row[0] for row in query.order_by(key).limit(PURGE_CHUNK_SIZE)]
+            if not keys:
+                return
+            last = keys[-1]
+            if on_chunk:
+                on_chunk(keys)
+            db.session.query(model).filter(key.in_(keys)).delete(synchronize_session=False)
+            db.session.commit()
+            job['deleted'][name] += len(keys)
+            self._report(job)
+            time.sleep(CHUNK_PAUSE_SECONDS)
+
+    def _reset(self, job, device_ids):
+        # The derived tables go first so nothing reports rows that are being deleted
+        self._clear_derived(job)
+        self._delete_chunks(job, 'attendance', Attendance, Attendance.id)
+        self._delete_chunks(job, 'students', Student, Student.id)
+        # Every worker stops resolving fingerprints to the deleted students now,
+        # so no new scans for them arrive during the second attendance pass
+        student_cache.invalidate()
+        # Scans that landed while the students were being deleted
+        self._delete_chunks(job, 'attendance', Attendance, Attendance.id)
+        self._clear_derived(job)
+        self._delete_chunks(job, 'timetable', Timetable, Timetable.id)
+        timetable_index.invalidate()
+        self._delete_chunks(job, 'scan receipts', ScanReceipt, ScanReceipt.scan_id)
+        job['deleted']['archive_files'] = archive.clear()
+
+        queue_for_devices('EMPTY_DB', None, device_ids)
+        db.session.commit()
+        command_notifier.notify()
+        session_cache.invalidate()
+        report_cache.invalidate()
+
+    def _clear_derived(self, job):
+        for name, model in (('rollups', AttendanceRollup), ('presence', StudentPresence)):
+            job['deleted'][name] = job['deleted'].get(name, 0) + db.session.query(model).delete()
+            db.session.commit()
+
+    def _purge(self, job, start, end, semester):
+        conditions = []
+        if start is not None:
+            conditions.append(Attendance.timestamp >= start)
+        if end is not None:
+            conditions.append(Attendance.timestamp < end)
+        student_ids = None
+        if semester:
+            student_ids = [student_id for (student_id,) in db.session.query(Student.id).filter(
+                Student.semester == str(semester))]
+            conditions.append(Attendance.student_id.in_(student_ids))
+        semesters = dict(db.session.query(Student.id, Student.semester).all())
+        touched = set()
+
+        def forget(ids):
+            # Same transaction as the delete, so the rollups never count purged rows
+            rows = db.session.query(Attendance.student_id, Attendance.timestamp, Attendance.subject,
+                                    Attendance.status).filter(Attendance.id.in_(ids)).all()
+            touched.update(row.student_id for row in rows)
+            subtract_counts(Counter(
+                (row.timestamp.date(), str(semesters[row.student_id]), row.subject, row.status)
+                for row in rows if row.student_id in semesters
+            ))
+
+        self._delete_chunks(job, 'attendance', Attendance, Attendance.id, *conditions, on_chunk=forget)
+
+        self._report(job, phase='deleting archived attendance')
+        removed = archive.purge(start, end, student_ids)
+        counts = Counter()
+        for day, student_id, subject, status, count in removed:
+            touched.add(student_id)
+            if student_id in semesters:
+                counts[(day, str(semesters[student_id]), subject, status)] += count
+        subtract_counts(counts)
+        db.session.commit()
+        job['deleted']['archived_attendance'] = sum(row[-1] for row in removed)
+
+        self._report(job, phase='refreshing presence')
+        touched = sorted(touched)
+        for offset in range(0, len(touched), PURGE_CHUNK_SIZE):
+            refresh_presence(touched[offset:offset + PURGE_CHUNK_SIZE])
+            db.session.commit()
+
+        session_cache.invalidate()
+        report_cache.invalidate()
@@ -0,0 +1,105 @@
+"""Sensor <-> database reconciliation of fingerprint slots.
+
+A LIST_IDS command makes the sketch read the sensor's template index and
+reply with one line, "IDS:<hex>": 32 bytes, one bit per slot (bit 0 of the
+first byte is slot 0). The bridge acknowledges the command with that line,
+so the latest done LIST_IDS command of a device holds its snapshot.
+
+The diff has two sides:
+- orphan slots: occupied on the sensor, but no enrolled student uses the
+  slot. These are fixed with one DELETE per slot.
+- missing templates: an enrolled student whose slot is empty on the
+  sensor. Optionally the student is marked not enrolled, so batch
+  enrollment picks them up again (with several scanners, only do this if
+  every sensor is meant to hold every student).
+"""
+from database import db, Student, Command
+from commands import queue_command
+
+REPLY_PREFIX = 'IDS:'
+
+
+def decode_bitmap(text):
+    """Occupied slot numbers from an 'IDS:<hex>' reply (or the bare hex)."""
+    if text.startswith(REPLY_PREFIX):
+        text = text[len(REPLY_PREFIX):]
+    data = bytes.fromhex(text.strip())
+    return {index * 8 + bit for index, byte in enumerate(data) for bit in range(8) if byte >> bit & 1} - {0}
+
+
+def latest_snapshot(device_id):
+    """The newest finished LIST_IDS command claimed by `device_id`, or None."""
+    return Command.query.filter(
+        Command.type == 'LIST_IDS',
+        Command.claimed_by == device_id,
+        Command.status.in_(('done', 'failed'))
+    ).order_by(Command.id.desc()).first() # Issue order: an expired command has no reply to sort by
+
+
+def diff(occupied):
+    """Compares occupied sensor slots with the student table (two set differences)."""
+    students = db.session.query(Student.id, Student.roll_no, Student.name, Student.fingerprint_id,
+                                Student.enrolled).all()
+    enrolled = {row.fingerprint_id: row for row in students if row.enrolled}
+    return {
+        'orphan_slots': sorted(occupied - enrolled.keys()),
+        'missing_templates': [
+            {'student_id': row.id, 'roll_no': row.roll_no, 'name': row.name, 'fingerprint_id': slot}
+            for slot, row in sorted(enrolled.items()) if slot not in occupied
+        ],
+        'matched': len(occupied & enrolled.keys()),
+        'occupied': len(occupied),
+    }
+
+
+def request_snapshots(device_ids):
+    """Queues one LIST_IDS per device (the caller commits and notifies)."""
+    return [queue_command('LIST_IDS', device_id=device_id) for device_id in device_ids]
+
+
+def report(device_id):
+    """Diff for the device's latest snapshot, or its pending/failed state."""
+    pending = Command.query.filter(
+        Command.type == 'LIST_IDS', Command.status.in_(('pending', 'claimed')),
+        (Command.device_id == device_id) | (Command.claimed_by == device_id)
+    ).first()
+    snapshot = latest_snapshot(device_id)
+    result = {'device_id': device_id, 'pending': pending is not None}
+    if snapshot is None:
+        return dict(result, status='none')
+    result['taken_at'] = snapshot.completed_at.isoformat(timespec='seconds') if snapshot.completed_at else None
+    if snapshot.status != 'done' or not (snapshot.result or '').startswith(REPLY_PREFIX):
+        return dict(result, status='failed', message=snapshot.result or 'No reply from device')
+    try:
+        occupied = decode_bitmap(snapshot.result)
+    except ValueError:
+        return dict(result, status='failed', message=f'Unreadable reply: {snapshot.result[:40]}')
+    return dict(result, status='ok', **diff(occupied))
+
+
+def fix(device_id, delete_orphans=True, mark_missing=False):
+    """Queues the minimal DELETEs for orphan slots and flags students whose template is gone.
+
+    Uses the device's latest snapshot. Returns the report it acted on (the
+    caller commits and notifies).
+    """
+    current = report(device_id)
+    if current['status'] != 'ok':
+        return current
+    queued = 0
+    if delete_orphans:
+        # Running the fix twice must not queue the same DELETE twice
+        in_flight = {payload for (payload,) in db.session.query(Command.payload).filter(
+            Command.type == 'DELETE', Command.status.in_(('pending', 'claimed')),
+            (Command.device_id == device_id) | (Command.claimed_by == device_id)
+        )}
+        for slot in current['orphan_slots']:
+            if str(slot) not in in_flight:
+                queue_command('DELETE', slot, device_id=device_id)
+                queued += 1
+    if mark_missing and current['missing_templates']:
+        Student.query.filter(
+            Student.id.in_([row['student_id'] for row in current['missing_templates']])
+        ).update({Student.enrolled: False}, synchronize_session=False)
+    return dict(current, deletes_queued=queued,
+                marked_not_enrolled=len(current['missing_templates']) if mark_missing else 0)
@@ -0,0 +1,110 @@
+from collections import Counter
+from datetime import date
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+import archive
+from database import db, Student, Attendance, AttendanceRollup
+
+
+def _apply(deltas):
+    """Adds signed counts to rollup rows with an atomic upsert per key. Caller commits."""
+    for (day, semester, subject, status), delta in deltas.items():
+        if not delta:
+            continue
+        statement = insert(AttendanceRollup).values(
+            day=day, semester=str(semester), subject=subject, status=status, count=delta
+        ).on_conflict_do_update(
+            index_elements=['day', 'semester', 'subject', 'status'],
+            set_={'count': AttendanceRollup.count + delta}
+        )
+        db.session.execute(statement)
+
+
+def record_logs(semester, logs):
+    """Counts new Attendance rows into the rollups (same transaction as the insert)."""
+    _apply(Counter((log.timestamp.date(), semester, log.subject, log.status) for log in logs))
+
+
+def _student_deltas(student_id, semester, sign):
+    rows = db.session.query(
+        func.date(Attendance.timestamp).label('day'),
+        Attendance.subject,
+        Attendance.status,
+        func.count(Attendance.id).label('count')
+    ).filter(Attendance.student_id == student_id).group_by('day', Attendance.subject, Attendance.status).all()
+    deltas = Counter()
+    for day, subject, status, count in rows:
+        deltas[(_as_date(day), str(semester), subject, status)] += sign * count
+    for day, _, subject, status, count in archive.daily_counts(student_id):
+        deltas[(day, str(semester), subject, status)] += sign * count
+    return deltas
+
+
+def subtract_student(student_id, semester):
+    """Removes a student's history from the rollups (before their rows are deleted). Caller commits."""
+    _apply(_student_deltas(student_id, semester, -1))
+    # Drop keys that reached zero so the table stays small
+    db.session.query(AttendanceRollup).filter(AttendanceRollup.count <= 0).delete()
+
+
+def subtract_counts(counts):
+    """Removes purged rows, {(day, semester, subject, status): count}, from the rollups. Caller commits."""
+    _apply(Counter({key: -count for key, count in counts.items()}))
+    db.session.query(AttendanceRollup).filter(AttendanceRollup.count <= 0).delete()
+
+
+def move_student(student_id, old_semester, new_semester):
+    """Re-files a student's history under a new semester after an edit. Caller commits."""
+    if str(old_semester) == str(new_semester):
+        return
+    subtract_student(student_id, old_semester)
+    _apply(_student_deltas(student_id, new_semester, 1))
+
+
+def rebuild_rollups():
+    """Backfills the rollups from the full Attendance log, archive included. Returns the number of rows."""
+    rows = db.session.query(
+        func.date(Attendance.timestamp).label('day'),
+        Student.semester,
+        Attendance.subject,
+        Attendance.status,
+        func.count(Attendance.id).label('count')
+    ).join(Student, Student.id == Attendance.student_id).group_by(
+        'day', Student.semester, Attendance.subject, Attendance.status
+    ).all()
+    counts = Counter()
+    for day, semester, subject, status, count in rows:
+        counts[(_as_date(day), semester, subject, status)] += count
+    semesters = dict(db.session.query(Student.id, Student.semester).all())
+    for day, student_id, subject, status, count in archive.daily_counts():
+        if student_id in semesters:
+            counts[(day, semesters[student_id], subject, status)] += count
+
+    db.session.query(AttendanceRollup).delete()
+    db.session.bulk_insert_mappings(AttendanceRollup, [
+        {'day': day, 'semester': semester, 'subject': subject, 'status': status, 'count': count}
+        for (day, semester, subject, status), count in counts.items()
+    ])
+    db.session.commit()
+    return len(counts)
+
+
+def daily_counts(start_date, end_date):
+    """{date: total scans} for days with activity in [start_date, end_date]."""
+    rows = db.session.query(
+        AttendanceRollup.day, func.sum(AttendanceRollup.count)
+    ).filter(AttendanceRollup.day.between(start_date, end_date)).group_by(AttendanceRollup.day).all()
+    return {day: int(total) for day, total in rows}
+
+
+def semester_counts():
+    """[(semester, total scans)] ordered by semester."""
+    rows = db.session.query(
+        AttendanceRollup.semester, func.sum(AttendanceRollup.count)
+    ).group_by(AttendanceRollup.semester).order_by(AttendanceRollup.semester).all()
+    return [(semester, int(total)) for semester, total in rows if total]
+
+
+def _as_date(value):
+    # func.date() comes back as a 'YYYY-MM-DD' string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(value)
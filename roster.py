@@ -0,0 +1,252 @@
+"""Bulk student roster import (CSV / XLSX) and roster export.
+
+The import streams the file in chunks of IMPORT_CHUNK_SIZE rows, cleans
+each chunk with vectorized pandas operations, and checks uniqueness of
+roll_no and fingerprint_id against sets loaded with one query up front.
+Valid rows are written with executemany INSERTs; the caller commits them
+all at once, so a failed import leaves the roster untouched.
+
+Rows with a blank fingerprint id get the lowest free sensor slot, the same
+slot the sketch's enrollment would pick (it scans 1..SENSOR_SLOTS), and are
+left not enrolled for the batch enrollment (enrollment.py).
+"""
+import csv
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from sqlalchemy import insert
+
+from database import db, Student
+
+IMPORT_CHUNK_SIZE = 1000
+SENSOR_SLOTS = 127 # handleEnrollment() in the sketch looks for a free slot in 1..127
+ROSTER_COLUMNS = ['Student Name', 'Register No', 'Semester', 'Fingerprint ID']
+FIELDS = ['name', 'roll_no', 'semester', 'fingerprint_id']
+# Accepted header spellings (compared lower-case) -> field
+HEADER_ALIASES = {
+    'name': 'name', 'student name': 'name',
+    'roll_no': 'roll_no', 'roll no': 'roll_no', 'register no': 'roll_no', 'register number': 'roll_no',
+    'semester': 'semester', 'sem': 'semester',
+    'fingerprint_id': 'fingerprint_id', 'fingerprint id': 'fingerprint_id',
+}
+# String(n) limits of the Student columns
+MAX_LENGTHS = {'name': 100, 'roll_no': 20, 'semester': 10}
+
+
+class RosterFormatError(ValueError):
+    """The file cannot be read as a roster at all (as opposed to bad rows)."""
+
+
+def normalize_headers(headers):
+    fields = [HEADER_ALIASES.get(str(h or '').strip().lower()) for h in headers]
+    missing = [f for f in ('name', 'roll_no', 'semester') if f not in fields]
+    if missing:
+        raise RosterFormatError(f"Missing column(s): {', '.join(missing)}")
+    repeated = {f for f in fields if f and fields.count(f) > 1}
+    if repeated:
+        raise RosterFormatError(f"Repeated column(s): {', '.join(sorted(repeated))}")
+    return fields
+
+
+def _frame(rows, fields):
+    frame = pd.DataFrame(rows, columns=fields, dtype=object)
+    frame = frame.loc[:, [f is not None for f in fields]]
+    return frame.reindex(columns=FIELDS)
+
+
+def read_roster_chunks(stream, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yields (first line number, DataFrame of FIELDS as strings) per chunk.
+
+    Line numbers are spreadsheet rows: the header is line 1.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        try:
+            # Blank lines are kept (and skipped later) so line numbers stay exact
+            reader = pd.read_csv(stream, encoding='utf-8-sig', dtype=str, keep_default_na=False,
+                                 chunksize=chunk_size, skip_blank_lines=False)
+        except pd.errors.EmptyDataError:
+            raise RosterFormatError("The file is empty")
+        fields, line = None, 2
+        for chunk in reader:
+            fields = fields or normalize_headers(chunk.columns)
+            yield line, _frame(chunk.values, fields)
+            line += len(chunk)
+    elif extension in ('.xlsx', '.xlsm'):
+        # Read-only mode streams rows instead of loading the whole sheet
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                raise RosterFormatError("The file is empty")
+            fields = normalize_headers(header)
+            buffered, line = [], 2
+            for row in rows:
+                buffered.append(list(row[:len(fields)]) + [None] * (len(fields) - len(row)))
+                if len(buffered) == chunk_size:
+                    yield line, _frame(buffered, fields)
+                    line += len(buffered)
+                    buffered = []
+            if buffered:
+                yield line, _frame(buffered, fields)
+        finally:
+            workbook.close()
+    else:
+        raise RosterFormatError("Upload a .csv or .xlsx file")
+
+
+def clean_chunk(chunk):
+    """Strips cells and parses fingerprint ids (vectorized). Adds an 'fp' column (NaN: blank/invalid)."""
+    chunk = chunk.copy()
+    for field in FIELDS:
+        chunk[field] = chunk[field].fillna('').astype(str).str.strip()
+    # Spreadsheets often store ids and semesters as floats ("3.0")
+    for field in ('semester', 'fingerprint_id'):
+        chunk[field] = chunk[field].str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+    chunk['fp'] = pd.to_numeric(chunk['fingerprint_id'], errors='coerce')
+    return chunk
+
+
+class RosterImport:
+    """One import run: the uniqueness sets, the per-row error report and the counters."""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        existing = db.session.query(Student.roll_no, Student.fingerprint_id).all()
+        self.roll_nos = {roll_no for roll_no, _ in existing}
+        self.fingerprint_ids = {fingerprint_id for _, fingerprint_id in existing}
+        self.errors = []
+        self.imported = 0
+        self.allocated = 0
+        self._needs_slot = [] # Valid rows without a fingerprint id, placed after every explicit id is known
+        self._next_slot = 1
+
+    def add_chunk(self, first_line, chunk):
+        chunk = clean_chunk(chunk)
+        valid = []
+        for offset, row in enumerate(chunk.itertuples(index=False)):
+            line = first_line + offset
+            if not (row.name or row.roll_no or row.semester or row.fingerprint_id):
+                continue # Blank line
+            errors = []
+            for field in ('name', 'roll_no', 'semester'):
+                value = getattr(row, field)
+                if not value:
+                    errors.append(f"{field} is required")
+                elif len(value) > MAX_LENGTHS[field]:
+                    errors.append(f"{field} is longer than {MAX_LENGTHS[field]} characters")
+            if row.roll_no and row.roll_no in self.roll_nos:
+                errors.append(f"roll_no {row.roll_no} already exists")
+
+            fingerprint_id = None
+            if row.fingerprint_id:
+                # isfinite first: int() of inf (or 1e400) raises instead of failing the row
+                if not np.isfinite(row.fp) or row.fp != int(row.fp):
+                    errors.append(f"fingerprint_id {row.fingerprint_id} is not an integer")
+                elif not 1 <= row.fp <= SENSOR_SLOTS:
+                    errors.append(f"fingerprint_id {row.fingerprint_id} is outside the sensor's slots 1..{SENSOR_SLOTS}")
+                else:
+                    fingerprint_id = int(row.fp)
+                    if fingerprint_id in self.fingerprint_ids:
+                        errors.append(f"fingerprint_id {fingerprint_id} is already used")
+
+            if errors:
+                self.errors.append({'line': line, 'roll_no': row.roll_no, 'errors': errors})
+                continue
+
+            self.roll_nos.add(row.roll_no)
+            # An explicit id is taken to be enrolled already; allocated slots still need a finger
+            student = {'name': row.name, 'roll_no': row.roll_no, 'semester': row.semester,
+                       'fingerprint_id': fingerprint_id, 'enrolled': fingerprint_id is not None}
+            if fingerprint_id is None:
+                self._needs_slot.append((line, student))
+            else:
+                self.fingerprint_ids.add(fingerprint_id)
+                valid.append(student)
+        self._insert(valid)
+
+    def finish(self):
+        """Allocates sensor slots for the rows that had none and inserts them."""
+        placed = []
+        for line, student in self._needs_slot:
+            while self._next_slot <= SENSOR_SLOTS and self._next_slot in self.fingerprint_ids:
+                self._next_slot += 1
+            if self._next_slot > SENSOR_SLOTS:
+                self.roll_nos.discard(student['roll_no'])
+                self.errors.append({'line': line, 'roll_no': student['roll_no'],
+                                    'errors': [f"no free fingerprint_id left (sensor has {SENSOR_SLOTS} slots)"]})
+                continue
+            student['fingerprint_id'] = self._next_slot
+            self.fingerprint_ids.add(self._next_slot)
+            placed.append(student)
+        self.allocated = len(placed)
+        self._needs_slot = []
+        self._insert(placed)
+        self.errors.sort(key=lambda error: error['line'])
+
+    def _insert(self, students):
+        if students and not self.dry_run:
+            db.session.execute(insert(Student), students)
+        self.imported += len(students)
+
+    def summary(self):
+        return {
+            'status': 'success' if not self.errors else 'partial',
+            'dry_run': self.dry_run,
+            'imported': self.imported,
+            'allocated_fingerprint_ids': self.allocated,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+
+def import_roster(stream, filename, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validates and inserts a roster file without committing. Returns the RosterImport."""
+    run = RosterImport(dry_run=dry_run)
+    for first_line, chunk in read_roster_chunks(stream, filename, chunk_size):
+        run.add_chunk(first_line, chunk)
+    run.finish()
+    return run
+
+
+def roster_query(semester=None):
+    query = db.session.query(Student.name, Student.roll_no, Student.semester, Student.fingerprint_id)
+    if semester:
+        query = query.filter(Student.semester == str(semester))
+    return query.order_by(Student.semester, Student.roll_no).yield_per(IMPORT_CHUNK_SIZE)
+
+
+def stream_roster_csv(query):
+    """Yields the roster as CSV text in chunks; the header matches what import_roster reads."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ROSTER_COLUMNS)
+    for count, row in enumerate(query, start=1):
+        writer.writerow(list(row))
+        if count % IMPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def build_roster_xlsx(query):
+    """Writes the roster to a temporary .xlsx file (write-only mode) and returns its path."""
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Students')
+        sheet.append(ROSTER_COLUMNS)
+        for row in query:
+            sheet.append(list(row))
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -1,154 +1,495 @@
 import serial
 import time
+import queue
+import sqlite3
+import threading
+import uuid
 import requests
 import json
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime
 
 # SERIAL CONFIGURATION
 # IMPORTANT: Change 'COM3' to your Arduino's port (e.g., 'COM3' on Windows, '/dev/ttyUSB0' on Linux)
 # IMPORTANT: Change 'COM3' to your Arduino's port
-SERIAL_PORT = 'COM11' 
+SERIAL_PORT = 'COM11'
 BAUD_RATE = 115200
 API_URL = "http://127.0.0.1:5000/api/scan"
-CMD_URL = "http://127.0.0.1:5000/api/get_command"
+BATCH_URL = "http://127.0.0.1:5000/api/scan_batch"
+CMD_URL = "http://127.0.0.1:5000/api/commands/next"
+CMD_ACK_URL = "http://127.0.0.1:5000/api/commands/{}/ack"
 REG_RESULT_URL = "http://127.0.0.1:5000/api/registration_result"
 LCD_STATUS_URL = "http://127.0.0.1:5000/api/lcd_status"
 HEARTBEAT_URL = "http://127.0.0.1:5000/api/heartbeat"
 
-# Use a session for persistent connections (faster)
-session = requests.Session()
+DEVICE_ID = "scanner-1" # Commands can be addressed to this device
+LAB_NAME = None # Lab this scanner is installed in (None: classes in any lab match)
+LONG_POLL_WAIT = 25 # Server holds the command request open until a command arrives
+HEARTBEAT_INTERVAL = 2.0
+HTTP_TIMEOUT = 5.0 # Never let one slow request stall a worker forever
 
-def main():
-    try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.1)
-        print(f"Connected to {SERIAL_PORT} at {BAUD_RATE} baud.")
-    except serial.SerialException as e:
-        print(f"Error connecting to serial port: {e}")
-        print("Please check your connection and port settings.")
-        return
+# Arduino replies that confirm a command: type -> {line prefix: succeeded?}
+COMMAND_REPLIES = {
+    'REGISTER': {'REG_SUCCESS:': True, 'REG_FAIL': False},
+    'DELETE': {'Deleted!': True, 'Something wrong': False},
+    'EMPTY_DB': {'DB_CLEARED': True, 'DB_CLEAR_FAIL': False},
+    'LIST_IDS': {'IDS:': True, 'IDS_FAIL': False}, # The ack carries the slot bitmap to the server
+}
 
-    print("Bridge Running. Listening for fingerprints and commands...")
+# OFFLINE BUFFER: every scan is journaled to disk before it is sent, so a
+# server outage delays attendance instead of losing it
+JOURNAL_PATH = "scan_journal.db"
+REPLAY_BATCH_SIZE = 100
+RETRY_INTERVAL = 5.0 # Seconds between replay attempts while the server is down
+LCD_REPLY_WINDOW = 2.0 # The Arduino waits ~2 s for a name after a scan
+MAX_ROUND_TRIP_SAMPLES = 500 # Round-trip times kept for the next heartbeat (server's /metrics)
 
-    last_poll_time = 0
-    last_heartbeat = 0
-    poll_interval = 1.0 # Poll server every 1 second
+# SEVERAL SCANNERS: list them in bridge_config.json (see README); without the
+# file the single scanner configured above is used
+CONFIG_PATH = "bridge_config.json"
 
-    while True:
-        try:
-            # 1. READ FROM ARDUINO
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8').strip()
-                if not line: continue
-                print(f"Arduino: {line}")
-
-                if line.startswith("ID:"):
-                    try:
-                        fingerprint_id = int(line.split(":")[1])
-                        print(f"Login Detected ID: {fingerprint_id}")
-                        
-                        # Send to Flask API
-                        payload = {'fingerprint_id': fingerprint_id}
-
-                        try:
-                            response = session.post(API_URL, json=payload)
-                            if response.status_code == 200:
-                                data = response.json()
-                                print(f"Server: {data.get('message')}")
-                                
-                                # Send Name to LCD based on type
-                                name = data.get('student_name', '')
-                                scan_type = data.get('scan_type', 'LOGIN') # Default to LOGIN if missing
-                                status = data.get('status', 'success')
-
-                                if status == 'search_failed': # Special case if search failed
-                                    ser.write(b"MSG:Not Found\n")
-
-                                elif status == 'error':
-                                    # Handle logical errors (No Class, etc)
-                                    msg = data.get('message', 'Error')
-                                    # Truncate to 16 chars for LCD
-                                    if len(msg) > 16: msg = msg[:16]
-                                    ser.write(f"MSG:{msg}\n".encode('utf-8'))
-                                    
-                                elif name:
-                                    if scan_type == 'LOGOUT':
-                                        ser.write(f"LOGOUT:{name}\n".encode('utf-8'))
-                                    else:
-                                        ser.write(f"LOGIN:{name}\n".encode('utf-8'))
-                            else:
-                                print(f"Server Error: {response.status_code}")
-                                ser.write(f"MSG:ServerErr {response.status_code}\n".encode('utf-8'))
-                        except requests.exceptions.RequestException as e:
-                            print(f"Connection Error: {e}")
-
-                    except ValueError:
-                        print("Invalid ID format.")
-
-                elif line.startswith("REG_SUCCESS:"):
-                    try:
-                        fingerprint_id = int(line.split(":")[1])
-                        print(f"Registration Success! New ID: {fingerprint_id}")
-
-                        session.post(REG_RESULT_URL, json={'status': 'success', 'fingerprint_id': fingerprint_id})
-                    except:
-                        pass
-                
-                elif line.startswith("REG_FAIL"):
-                    print("Registration Failed on Device")
-                elif line.startswith("REG_FAIL"):
-                    print("Registration Failed on Device")
-                    session.post(REG_RESULT_URL, json={'status': 'failed', 'message': 'Device failed to enroll'})
-
-                elif line.startswith("LCD:"):
-                    msg = line[4:].strip()
-                    # print(f"LCD: {msg}") # Optional logging
-                    try:
-                        session.post(LCD_STATUS_URL, json={'message': msg})
-                    except:
-                        pass
-
-            # 2. POLL SERVER FOR COMMANDS
-            current_time = time.time()
-            if current_time - last_poll_time > poll_interval:
-                last_poll_time = current_time
-                try:
-                    response = session.get(CMD_URL)
-                    if response.status_code == 200:
-                        data = response.json()
-                        cmd_type = data.get('type')
-                        
-                        if cmd_type == "REGISTER":
-                            print("Received REGISTER command. Sending to Arduino...")
-                            ser.write(b"REGISTER\n")
-                            
-                        elif cmd_type == "DELETE":
-                            fingerprint_id = data.get('id')
-                            print(f"Received DELETE command for ID {fingerprint_id}. Sending to Arduino...")
-                            command_str = f"DELETE:{fingerprint_id}\n"
-                            ser.write(command_str.encode('utf-8'))
-                            
-                        elif cmd_type == "EMPTY_DB":
-                            print("Received EMPTY_DB command. Clearing sensor...")
-                            ser.write(b"EMPTY_DB\n")
-                            
-                except requests.exceptions.RequestException:
-                    pass # Server might be down
-            
-            # 3. SEND HEARTBEAT (Every 2 seconds)
-            if current_time - last_heartbeat > 2.0:
-                last_heartbeat = current_time
+DeviceConfig = namedtuple('DeviceConfig', ['device_id', 'port', 'baud_rate', 'lab_name', 'journal_path'])
+
+
+def load_config(path=CONFIG_PATH):
+    """Scanners this bridge drives, from `path` or the constants above."""
+    if not os.path.exists(path):
+        return [DeviceConfig(DEVICE_ID, SERIAL_PORT, BAUD_RATE, LAB_NAME, JOURNAL_PATH)]
+    with open(path) as f:
+        config = json.load(f)
+    devices = []
+    for entry in config.get('devices', []):
+        device_id = entry['device_id']
+        devices.append(DeviceConfig(
+            device_id,
+            entry['port'],
+            entry.get('baud_rate', BAUD_RATE),
+            entry.get('lab_name'),
+            entry.get('journal', f"scan_journal_{device_id}.db") # One offline buffer per scanner
+        ))
+    return devices
+
+
+logger = logging.getLogger('serial_bridge')
+
+
+class ScanJournal:
+    """Append-only SQLite queue of scans not yet acknowledged by the server.
+
+    Each scan gets a client-generated scan_id, so resending a batch whose
+    response was lost is harmless (the server dedupes on it).
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        # Used only from the scan worker thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scans ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " scan_id TEXT UNIQUE NOT NULL,"
+            " fingerprint_id INTEGER NOT NULL,"
+            " scanned_at TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+    def append(self, fingerprint_id, scanned_at=None):
+        scan_id = uuid.uuid4().hex
+        scanned_at = (scanned_at or datetime.now()).isoformat()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO scans (scan_id, fingerprint_id, scanned_at) VALUES (?, ?, ?)",
+                (scan_id, fingerprint_id, scanned_at)
+            )
+        return scan_id
+
+    def pending(self, limit=REPLAY_BATCH_SIZE):
+        """Oldest unacknowledged scans, in scan order."""
+        rows = self.conn.execute(
+            "SELECT scan_id, fingerprint_id, scanned_at FROM scans ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+        return [{'scan_id': r[0], 'fingerprint_id': r[1], 'timestamp': r[2]} for r in rows]
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+
+    def acknowledge(self, scan_ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM scans WHERE scan_id = ?", [(i,) for i in scan_ids])
+
+    def close(self):
+        self.conn.close()
+
+
+class Bridge:
+    """Serial <-> HTTP bridge for one scanner, split into independent worker threads.
+
+    - reader:     serial lines -> scan / LCD / registration queues
+    - writer:     the only thread that writes to the serial port
+    - scans:      journal each scan, replay the journal to /api/scan_batch,
+                  reply to the LCD
+    - lcd:        forwards LCD text (only the newest pending message)
+    - events:     registration results and command acknowledgements
+
+    Heartbeats and command polling are shared by every scanner of the
+    process, see BridgeHub. Each HTTP worker has its own requests.Session
+    (sessions are not thread safe), so a slow poll never delays a scan reply.
+    """
+
+    def __init__(self, ser, journal=None, device=None):
+        self.ser = ser
+        self.device = device or DeviceConfig(DEVICE_ID, SERIAL_PORT, BAUD_RATE, LAB_NAME, JOURNAL_PATH)
+        self.journal = journal or ScanJournal(self.device.journal_path)
+        self.stop = threading.Event()
+        self.scan_queue = queue.Queue()
+        self.lcd_queue = queue.Queue()
+        self.event_queue = queue.Queue()
+        self.write_queue = queue.Queue()
+        self.command_lock = threading.Lock()
+        self.pending_command = None # (command_id, type) awaiting the Arduino's reply
+        self.round_trip_lock = threading.Lock()
+        self.round_trips = [] # Seconds from reading a scan to the server's reply
+
+    # --- Serial side ---
+
+    def send(self, text):
+        """Queues one line for the Arduino (thread safe)."""
+        self.write_queue.put(f"{text}\n".encode('utf-8'))
+
+    def reader_loop(self):
+        while not self.stop.is_set():
+            try:
+                raw = self.ser.readline() # Returns b'' after the port timeout
+            except serial.SerialException as e:
+                logger.error("[%s] Serial Error: %s", self.device.device_id, e)
+                self.stop.set()
+                break
+            line = raw.decode('utf-8', errors='replace').strip()
+            if line:
+                self.dispatch(line)
+
+    def dispatch(self, line):
+        logger.debug("[%s] Arduino: %s", self.device.device_id, line)
+        self.confirm_command(line)
+
+        if line.startswith("ID:"):
+            try:
+                fingerprint_id = int(line.split(":")[1])
+                logger.info("[%s] Login Detected ID: %s", self.device.device_id, fingerprint_id)
+                self.scan_queue.put((fingerprint_id, datetime.now())) # Device time of the scan
+            except ValueError:
+                logger.warning("Invalid ID format: %s", line)
+
+        elif line.startswith("REG_SUCCESS:"):
+            try:
+                fingerprint_id = int(line.split(":")[1])
+                logger.info("Registration Success! New ID: %s", fingerprint_id)
+                self.event_queue.put((REG_RESULT_URL, {'device_id': self.device.device_id, 'status': 'success',
+                                                       'fingerprint_id': fingerprint_id}))
+            except ValueError:
+                pass
+
+        elif line.startswith("REG_FAIL"):
+            logger.warning("Registration Failed on Device")
+            self.event_queue.put((REG_RESULT_URL, {'device_id': self.device.device_id, 'status': 'failed',
+                                                   'message': 'Device failed to enroll'}))
+
+        elif line.startswith("LCD:"):
+            self.lcd_queue.put(line[4:].strip())
+
+    def writer_loop(self):
+        while not self.stop.is_set():
+            try:
+                data = self.write_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.ser.write(data)
+            except serial.SerialException as e:
+                logger.error("[%s] Serial Write Error: %s", self.device.device_id, e)
+
+    # --- HTTP side ---
+
+    def scan_loop(self):
+        session = requests.Session()
+        next_retry = 0
+        backlog = self.journal.count()
+        if backlog:
+            logger.info("Offline journal has %s unsent scans; replaying...", backlog)
+
+        while not self.stop.is_set():
+            new_scan = False
+            try:
+                fingerprint_id, scanned_at = self.scan_queue.get(timeout=0.5)
+                self.journal.append(fingerprint_id, scanned_at)
+                new_scan = True
+                next_retry = 0 # A fresh scan is worth an immediate attempt
+            except queue.Empty:
+                pass
+
+            if time.time() >= next_retry and self.journal.count():
+                if not self.flush_journal(session, notify_failure=new_scan):
+                    next_retry = time.time() + RETRY_INTERVAL
+
+    def flush_journal(self, session, notify_failure=False):
+        """Replays pending scans in order. Returns False if the server is unreachable.
+
+        With notify_failure, a failed send tells the waiting LCD the scan was kept.
+        """
+        while not self.stop.is_set():
+            batch = self.journal.pending()
+            if not batch:
+                return True
+
+            try:
+                response = session.post(BATCH_URL, json={
+                    'device_id': self.device.device_id, 'lab_name': self.device.lab_name, 'scans': batch
+                }, timeout=HTTP_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                logger.warning("Connection Error: %s (%s scans buffered offline)", e, self.journal.count())
+                if notify_failure:
+                    self.notify_if_fresh(batch[-1], "MSG:Saved Offline")
+                return False
+
+            if response.status_code != 200:
+                logger.warning("Server Error: %s", response.status_code)
+                if notify_failure:
+                    self.notify_if_fresh(batch[-1], f"MSG:ServerErr {response.status_code}")
+                return False
+
+            results = response.json().get('results', [])
+            self.journal.acknowledge([r['scan_id'] for r in results if r.get('scan_id')])
+
+            # Only a scan the Arduino is still waiting on gets an LCD reply
+            for scan, result in zip(batch, results):
+                if self.is_fresh(scan):
+                    self.reply_to_lcd(result)
+                    self.record_round_trip(scan)
+        return True
+
+    def record_round_trip(self, scan):
+        seconds = (datetime.now() - datetime.fromisoformat(scan['timestamp'])).total_seconds()
+        logger.debug("[%s] Scan round trip: %.1f ms", self.device.device_id, seconds * 1000)
+        with self.round_trip_lock:
+            if len(self.round_trips) < MAX_ROUND_TRIP_SAMPLES:
+                self.round_trips.append(round(seconds, 4))
+
+    def take_round_trips(self):
+        """Round-trip samples since the last call (sent with the next heartbeat)."""
+        with self.round_trip_lock:
+            samples, self.round_trips = self.round_trips, []
+        return samples
+
+    def is_fresh(self, scan):
+        age = datetime.now() - datetime.fromisoformat(scan['timestamp'])
+        return age.total_seconds() <= LCD_REPLY_WINDOW
+
+    def notify_if_fresh(self, scan, text):
+        if self.is_fresh(scan):
+            self.send(text)
+
+    def reply_to_lcd(self, data):
+        """Sends the scan outcome to the Arduino's LCD."""
+        logger.info("Server: %s", data.get('message'))
+
+        # Send Name to LCD based on type
+        name = data.get('student_name', '')
+        scan_type = data.get('scan_type', 'LOGIN') # Default to LOGIN if missing
+        status = data.get('status', 'success')
+
+        if status == 'search_failed': # Special case if search failed
+            self.send("MSG:Not Found")
+
+        elif status == 'error':
+            # Handle logical errors (No Class, etc)
+            msg = data.get('message', 'Error')
+            # Truncate to 16 chars for LCD
+            if len(msg) > 16: msg = msg[:16]
+            self.send(f"MSG:{msg}")
+
+        elif name:
+            if scan_type == 'LOGOUT':
+                self.send(f"LOGOUT:{name}")
+            else:
+                self.send(f"LOGIN:{name}")
+
+    def lcd_loop(self):
+        session = requests.Session()
+        while not self.stop.is_set():
+            try:
+                msg = self.lcd_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Only the newest text matters for the dashboard; skip stale ones
+            while True:
                 try:
-                    session.post(HEARTBEAT_URL)
-                except:
-                    pass
+                    msg = self.lcd_queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                session.post(LCD_STATUS_URL, json={'device_id': self.device.device_id, 'message': msg},
+                             timeout=HTTP_TIMEOUT)
+            except requests.exceptions.RequestException:
+                pass
+
+    def event_loop(self):
+        session = requests.Session()
+        while not self.stop.is_set():
+            try:
+                url, payload = self.event_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                session.post(url, json=payload, timeout=HTTP_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                logger.warning("Connection Error: %s", e)
+
+    def confirm_command(self, line):
+        """Acknowledges the pending command if `line` is the Arduino's reply to it."""
+        with self.command_lock:
+            if self.pending_command is None:
+                return
+            command_id, cmd_type = self.pending_command
+            for prefix, ok in COMMAND_REPLIES.get(cmd_type, {}).items():
+                if line.startswith(prefix):
+                    self.pending_command = None
+                    break
+            else:
+                return
+        self.event_queue.put((CMD_ACK_URL.format(command_id),
+                              {'device_id': self.device.device_id, 'status': 'done' if ok else 'failed',
+                               'result': line}))
+
+    def run_command(self, data):
+        cmd_type = data.get('type')
+        if data.get('command_id') is not None and cmd_type in COMMAND_REPLIES:
+            with self.command_lock:
+                self.pending_command = (data['command_id'], cmd_type)
+
+        if cmd_type == "REGISTER":
+            logger.info("Received REGISTER command. Sending to Arduino...")
+            self.send("REGISTER")
+
+        elif cmd_type == "DELETE":
+            fingerprint_id = data.get('id')
+            logger.info("Received DELETE command for ID %s. Sending to Arduino...", fingerprint_id)
+            self.send(f"DELETE:{fingerprint_id}")
+
+        elif cmd_type == "EMPTY_DB":
+            logger.info("Received EMPTY_DB command. Clearing sensor...")
+            self.send("EMPTY_DB")
 
+        elif cmd_type == "LIST_IDS":
+            logger.info("Received LIST_IDS command. Reading sensor slots...")
+            self.send("LIST_IDS")
+
+    def workers(self):
+        return [self.reader_loop, self.writer_loop, self.scan_loop, self.lcd_loop, self.event_loop]
+
+    def run(self):
+        BridgeHub([self]).run()
+
+
+class BridgeHub:
+    """Runs several Bridges plus the workers they share.
+
+    - heartbeat:  one POST every HEARTBEAT_INTERVAL listing every scanner
+                  whose serial port is still open, with its scan round-trip
+                  times since the last beat
+    - commands:   one long-poll for all scanners (device_id repeated); each
+                  command is routed to the scanner it was claimed for. The
+                  server hands a scanner nothing new until its previous
+                  command is acknowledged or times out.
+    """
+
+    def __init__(self, bridges):
+        self.bridges = {bridge.device.device_id: bridge for bridge in bridges}
+        self.stop = threading.Event()
+
+    def live_bridges(self):
+        return [bridge for bridge in self.bridges.values() if not bridge.stop.is_set()]
+
+    def heartbeat_loop(self):
+        session = requests.Session()
+        while not self.stop.wait(HEARTBEAT_INTERVAL):
+            devices = [{'device_id': bridge.device.device_id, 'lab_name': bridge.device.lab_name,
+                        'round_trips': bridge.take_round_trips()}
+                       for bridge in self.live_bridges()]
+            if not devices:
+                continue
+            try:
+                session.post(HEARTBEAT_URL, json={'devices': devices}, timeout=HTTP_TIMEOUT)
+            except requests.exceptions.RequestException:
+                pass
+
+    def command_loop(self):
+        session = requests.Session()
+        while not self.stop.is_set():
+            device_ids = [bridge.device.device_id for bridge in self.live_bridges()]
+            if not device_ids:
+                self.stop.wait(RETRY_INTERVAL)
+                continue
+            try:
+                response = session.get(CMD_URL, params={'device_id': device_ids, 'wait': LONG_POLL_WAIT},
+                                       timeout=LONG_POLL_WAIT + HTTP_TIMEOUT)
+            except requests.exceptions.RequestException:
+                self.stop.wait(RETRY_INTERVAL) # Server might be down
+                continue
+            if response.status_code != 200:
+                self.stop.wait(RETRY_INTERVAL)
+                continue
+            data = response.json()
+            if data.get('type'):
+                bridge = self.bridges.get(data.get('device_id')) or self.live_bridges()[0]
+                bridge.run_command(data)
+
+    def run(self):
+        workers = [self.heartbeat_loop, self.command_loop]
+        for bridge in self.bridges.values():
+            workers += bridge.workers()
+        threads = [threading.Thread(target=worker, name=worker.__name__, daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+        try:
+            # Runs while at least one scanner is still connected
+            while self.live_bridges():
+                time.sleep(0.5)
         except KeyboardInterrupt:
-            print("\nExiting...")
-            break
-        except Exception as e:
-            print(f"Error: {e}")
-            time.sleep(1)
+            logger.info("Exiting...")
+        self.stop.set()
+        for bridge in self.bridges.values():
+            bridge.stop.set()
+        for thread in threads:
+            thread.join(timeout=LONG_POLL_WAIT + HTTP_TIMEOUT + 1)
+
+
+def main():
+    # LOG_LEVEL=DEBUG also echoes every serial line and scan round trip
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(message)s')
+    bridges = []
+    for device in load_config():
+        try:
+            ser = serial.Serial(device.port, device.baud_rate, timeout=0.1)
+            logger.info("[%s] Connected to %s at %s baud%s.", device.device_id, device.port, device.baud_rate,
+                        f" (lab {device.lab_name})" if device.lab_name else '')
+        except serial.SerialException as e:
+            logger.error("[%s] Error connecting to serial port: %s", device.device_id, e)
+            logger.error("Please check your connection and port settings.")
+            continue
+        bridges.append(Bridge(ser, ScanJournal(device.journal_path), device))
+
+    if not bridges:
+        return
+
+    logger.info("Bridge Running. Listening for fingerprints and commands...")
+
+    BridgeHub(bridges).run()
 
-    ser.close()
+    for bridge in bridges:
+        bridge.journal.close()
+        bridge.ser.close()
 
 if __name__ == "__main__":
     main()
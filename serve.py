@@ -0,0 +1,49 @@
+"""Production entry point: the app behind waitress, a multi-threaded WSGI server.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--threads 16] [--bridges 2]
+
+`python app.py` stays the development server (debug reloader, one process).
+Here every request gets one of --threads worker threads, and each thread
+uses a pooled SQLite connection set up by database.py (WAL, busy_timeout,
+synchronous=NORMAL, mmap). Keep DB_POOL_SIZE >= --threads.
+
+Long-lived requests each hold a thread: an open live dashboard's event
+stream (at most SSE_MAX_STREAMS per process, default 8; further pages get a
+503 and poll instead) and a scanner bridge's /api/commands/next long-poll
+(up to COMMAND_MAX_WAIT seconds). Size --threads as SSE_MAX_STREAMS + number
+of bridges + about 6 for scans and page loads; the default 16 fits the
+default cap with two bridges. A lower value is raised to that minimum.
+"""
+import argparse
+import os
+
+from waitress import serve
+
+from app import app, init_db
+from events import SSE_MAX_STREAMS
+
+SPARE_THREADS = 6 # Left for scans and page loads when every stream is open
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVER_THREADS', 16)))
+    parser.add_argument('--bridges', type=int, default=int(os.environ.get('SCANNER_BRIDGES', 2)),
+                        help='serial bridges long-polling for commands')
+    args = parser.parse_args()
+    needed = SSE_MAX_STREAMS + args.bridges + SPARE_THREADS
+    if args.threads < needed:
+        print(f"--threads {args.threads} leaves too few threads for scans; using {needed}")
+        args.threads = needed
+
+    # Creates the schema on a fresh install and upgrades an existing one
+    init_db()
+
+    print(f"Serving on http://{args.host}:{args.port} with {args.threads} threads")
+    serve(app, host=args.host, port=args.port, threads=args.threads, ident='lab-attendance')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, type_coerce
+
+import archive
+from cache_sync import SharedGeneration
+from database import db, Student, Attendance
+
+SESSION_COLUMNS = ['student_id', 'name', 'roll_no', 'semester', 'subject', 'login', 'logout', 'minutes', 'closed']
+# A LOGIN is paired with a LOGOUT up to this long after the login day ends
+PAIRING_WINDOW = timedelta(days=1)
+# Past days kept by SessionCache; the least recently used day goes first
+SESSION_CACHE_MAX_DAYS = int(os.environ.get('SESSION_CACHE_MAX_DAYS', 120))
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None # Ignore missing/invalid dates
+
+
+def first_log_day():
+    """Day of the oldest attendance row, archived or live (today if there are none)."""
+    first = db.session.query(db.func.min(Attendance.timestamp)).scalar()
+    days = [day for day in (archive.first_day(), first.date() if first else None) if day]
+    return min(days) if days else date.today()
+
+
+def load_events(start, end):
+    """Attendance rows with start <= timestamp < end (live and archived) as a DataFrame."""
+    rows = db.session.query(
+        Attendance.id,
+        Attendance.student_id,
+        Student.name,
+        Student.roll_no,
+        Student.semester,
+        Attendance.subject,
+        Attendance.status,
+        # Raw text, parsed below in one vectorized call instead of per row
+        type_coerce(Attendance.timestamp, String)
+    ).join(Student, Student.id == Attendance.student_id).filter(
+        Attendance.timestamp >= start, Attendance.timestamp < end
+    ).all()
+    events = pd.DataFrame.from_records(
+        rows, columns=['id', 'student_id', 'name', 'roll_no', 'semester', 'subject', 'status', 'timestamp']
+    )
+    events['timestamp'] = pd.to_datetime(events['timestamp'], format='ISO8601')
+
+    archived = archive.rows_frame(start, end)
+    if archived.empty:
+        return events
+    students = pd.DataFrame.from_records(
+        db.session.query(Student.id, Student.name, Student.roll_no, Student.semester).all(), columns=['student_id', 'name', 'roll_no', 'semester']
+    )
+    archived = archived.merge(students, on='student_id')[events.columns]
+    return pd.concat([archived, events], ignore_index=True) if not events.empty else archived
+
+
+def pair_sessions(events):
+    """Pairs LOGIN/LOGOUT events into sessions in one sorted, vectorized pass.
+
+    api_scan always closes a session with a LOGOUT of the same subject before
+    anything else happens to that student (same-class logout, switch
+    auto-logout and break logout all do), so a session is a LOGIN followed
+    directly by that LOGOUT. A LOGIN with no matching next event stays open
+    (closed=False, minutes NaN).
+    """
+    if events.empty:
+        return pd.DataFrame(columns=SESSION_COLUMNS)
+
+    ev = events.sort_values(['student_id', 'timestamp', 'id'], kind='stable').reset_index(drop=True)
+    student = ev['student_id'].to_numpy()
+    status = ev['status'].to_numpy()
+    subject = ev['subject'].to_numpy()
+    timestamp = ev['timestamp'].to_numpy(dtype='datetime64[ns]')
+
+    next_same_student = np.zeros(len(ev), dtype=bool)
+    next_same_student[:-1] = student[1:] == student[:-1]
+    next_status = np.roll(status, -1)
+    next_subject = np.roll(subject, -1)
+    next_time = np.roll(timestamp, -1)
+
+    is_login = status == 'LOGIN'
+    closed = is_login & next_same_student & (next_status == 'LOGOUT') & (next_subject == subject)
+
+    sessions = ev.loc[is_login, ['student_id', 'name', 'roll_no', 'semester', 'subject']].copy()
+    sessions['login'] = timestamp[is_login]
+    sessions['logout'] = np.where(closed, next_time, np.datetime64('NaT'))[is_login]
+    sessions['closed'] = closed[is_login]
+    sessions['minutes'] = (sessions['logout'] - sessions['login']).dt.total_seconds() / 60
+    return sessions[SESSION_COLUMNS].reset_index(drop=True)
+
+
+class SessionCache:
+    """Per-day session frames (keyed by login day).
+
+    Past days are cached until invalidated or until more than max_days are
+    held (least recently used first); today is always recomputed since it
+    is still changing.
+    """
+
+    def __init__(self, max_days=SESSION_CACHE_MAX_DAYS):
+        self._lock = threading.Lock()
+        self._days = OrderedDict()
+        self.max_days = max_days
+        self.generation = SharedGeneration('cache_generation:sessions')
+
+    def invalidate(self, day=None):
+        """Drops one day (plus the day before, whose pairing window reaches it) or everything.
+
+        Other workers only learn that something changed, so they drop everything.
+        """
+        with self._lock:
+            if day is None:
+                self._days.clear()
+            else:
+                self._days.pop(day, None)
+                self._days.pop(day - timedelta(days=1), None)
+        if self.generation.bump():
+            self._drop()
+
+    def _drop(self):
+        with self._lock:
+            self._days.clear()
+
+    def sessions_between(self, start_day, end_day):
+        """Sessions whose login falls on start_day..end_day (inclusive)."""
+        if self.generation.changed():
+            self._drop()
+        today = date.today()
+        days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+        with self._lock:
+            cached = {day: self._days[day] for day in days if day in self._days}
+            for day in cached:
+                self._days.move_to_end(day)
+        missing = [day for day in days if day not in cached]
+
+        if missing:
+            # One query covering every uncached day, then split by login day
+            start = datetime.combine(missing[0], datetime.min.time())
+            end = datetime.combine(missing[-1], datetime.min.time()) + timedelta(days=1) + PAIRING_WINDOW
+            sessions = pair_sessions(load_events(start, end))
+            empty = sessions.iloc[0:0]
+            fresh = {day: empty for day in missing}
+            if not sessions.empty:
+                for day, frame in sessions.groupby(sessions['login'].dt.date, sort=False):
+                    if day in fresh:
+                        fresh[day] = frame
+            with self._lock:
+                for day, frame in fresh.items():
+                    if day < today:
+                        self._days[day] = frame
+                        self._days.move_to_end(day)
+                while len(self._days) > self.max_days:
+                    self._days.popitem(last=False)
+            cached.update(fresh)
+
+        frames = [cached[day] for day in days if not cached[day].empty]
+        if not frames:
+            return pd.DataFrame(columns=SESSION_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+session_cache = SessionCache()
+
+
+def session_hours(sessions, by=('student_id', 'roll_no', 'name', 'semester', 'subject')):
+    """Totals closed-session minutes and counts per group."""
+    if sessions.empty:
+        return pd.DataFrame(columns=list(by) + ['sessions', 'minutes', 'open_sessions'])
+    grouped = sessions.groupby(list(by), sort=True)
+    totals = grouped.agg(
+        sessions=('closed', 'sum'),
+        minutes=('minutes', 'sum'),
+        open_sessions=('closed', lambda closed: int((~closed.astype(bool)).sum()))
+    ).reset_index()
+    totals['sessions'] = totals['sessions'].astype(int)
+    totals['minutes'] = totals['minutes'].round(1)
+    return totals
+
+
+def filter_sessions(sessions, roll_no=None, semester=None, subject=None):
+    """Same filters as the export: exact roll_no/semester, subject substring (case-insensitive)."""
+    if roll_no:
+        sessions = sessions[sessions['roll_no'] == roll_no]
+    if semester:
+        sessions = sessions[sessions['semester'].astype(str) == str(semester)]
+    if subject:
+        sessions = sessions[sessions['subject'].str.contains(subject, case=False, regex=False, na=False)]
+    return sessions
+
+
+def iter_sessions_for_export(start_day, end_day, semester=None, subject=None):
+    """Sessions matching download_excel's filters, one frame per login day (oldest first).
+
+    Only one day is held at a time, so the Durations sheet can be written
+    from a range of any length in bounded memory.
+    """
+    day = start_day
+    while day <= end_day:
+        sessions = filter_sessions(session_cache.sessions_between(day, day), semester=semester, subject=subject)
+        if not sessions.empty:
+            yield sessions.sort_values(['login', 'roll_no'])
+        day += timedelta(days=1)
@@ -0,0 +1,152 @@
+"""Small key/value store for the app's runtime state (device, LCD, registration, manual session).
+
+The default MemoryStateStore keeps everything in this process, which is all a
+single `app.run()` needs. SQLiteStateStore keeps the same keys in a SQLite
+file so several worker processes see one state; pick it with
+STATE_BACKEND=sqlite (and optionally STATE_DB_PATH).
+
+Values must be JSON-serializable. Both stores hand out copies, so mutating a
+returned dict never changes the stored state; use set() or update().
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STATE = {
+    'registration_status': {'status': 'idle', 'message': '', 'fingerprint_id': None},
+    'manual_class_status': {'active': False, 'subject': None, 'semester': 'All'}, # Global Manual Override
+    'manual_session': {'active': False, 'subject': None, 'semester': None, 'lab_name': 'Manual Mode'},
+    'lcd_message': "Initializing...",
+    'last_heartbeat_time': 0,
+    'last_log_id': 0,
+    'devices': {}, # device_id -> {'lab_name': ...}, see devices.py
+}
+
+
+class MemoryStateStore:
+    """Per-process state guarded by one lock."""
+
+    shared = False
+
+    def __init__(self, defaults=None):
+        self._lock = threading.Lock()
+        self._defaults = dict(defaults or DEFAULT_STATE)
+        self._values = {}
+
+    def _load(self, key):
+        if key in self._values:
+            return json.loads(self._values[key])
+        return json.loads(json.dumps(self._defaults.get(key)))
+
+    def get(self, key):
+        with self._lock:
+            return self._load(key)
+
+    def get_many(self, keys):
+        with self._lock:
+            return {key: self._load(key) for key in keys}
+
+    def set(self, key, value):
+        encoded = json.dumps(value)
+        with self._lock:
+            self._values[key] = encoded
+
+    def update(self, key, fn):
+        """Atomically replaces the value with fn(old value). Returns (old, new)."""
+        with self._lock:
+            old = self._load(key)
+            new = fn(json.loads(json.dumps(old)))
+            self._values[key] = json.dumps(new)
+        return old, new
+
+
+class SQLiteStateStore:
+    """State shared by every process that opens the same SQLite file.
+
+    set() is one UPSERT; update() runs its read-modify-write inside
+    BEGIN IMMEDIATE, so concurrent updates from different workers serialize
+    instead of overwriting each other. Connections are per thread.
+    """
+
+    shared = True
+
+    def __init__(self, path, defaults=None, busy_timeout_ms=5000):
+        self.path = path
+        self._defaults = dict(defaults or DEFAULT_STATE)
+        self._busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS app_state ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; update() opens its own transaction
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout={int(self._busy_timeout_ms)}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _decode(self, key, row):
+        if row is None:
+            return json.loads(json.dumps(self._defaults.get(key)))
+        return json.loads(row[0])
+
+    def get(self, key):
+        row = self._connection().execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+        return self._decode(key, row)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        placeholders = ','.join('?' * len(keys))
+        rows = dict(self._connection().execute(
+            f"SELECT key, value FROM app_state WHERE key IN ({placeholders})", keys
+        ).fetchall())
+        return {key: self._decode(key, (rows[key],) if key in rows else None) for key in keys}
+
+    def set(self, key, value):
+        self._connection().execute(
+            "INSERT INTO app_state (key, value, updated_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (key, json.dumps(value), time.time())
+        )
+
+    def update(self, key, fn):
+        """Atomically replaces the value with fn(old value). Returns (old, new)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+            old = self._decode(key, row)
+            new = fn(json.loads(json.dumps(old)))
+            conn.execute(
+                "INSERT INTO app_state (key, value, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (key, json.dumps(new), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return old, new
+
+
+def create_state_store(backend=None, path=None):
+    """Store named by `backend` ('memory' or 'sqlite'), defaulting to STATE_BACKEND."""
+    backend = (backend or os.environ.get('STATE_BACKEND', 'memory')).lower()
+    if backend == 'memory':
+        return MemoryStateStore()
+    if backend == 'sqlite':
+        return SQLiteStateStore(path or os.environ.get('STATE_DB_PATH', 'app_state.db'))
+    raise ValueError(f"Unknown STATE_BACKEND: {backend}")
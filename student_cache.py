@@ -0,0 +1,50 @@
+import threading
+from collections import namedtuple
+
+from cache_sync import SharedGeneration
+
+# Detached copy of the Student columns needed on the scan path
+StudentSnapshot = namedtuple('StudentSnapshot', ['id', 'name', 'roll_no', 'semester', 'fingerprint_id'])
+
+
+class StudentCache:
+    """fingerprint_id -> student map, loaded once and dropped on roster writes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_fingerprint = None
+        self.generation = SharedGeneration('cache_generation:students')
+
+    def invalidate(self):
+        """Drops the cached roster (in every worker). The next lookup reloads it from the DB."""
+        self._drop()
+        self.generation.bump()
+
+    def _drop(self):
+        with self._lock:
+            self._by_fingerprint = None
+
+    def _load(self):
+        from database import db, Student
+        rows = db.session.query(
+            Student.id, Student.name, Student.roll_no, Student.semester, Student.fingerprint_id
+        ).all()
+        return {row.fingerprint_id: StudentSnapshot(*row) for row in rows}
+
+    def get(self, fingerprint_id):
+        """Returns the StudentSnapshot for a sensor slot, or None if unknown."""
+        if self.generation.changed():
+            self._drop()
+        by_fingerprint = self._by_fingerprint
+        if by_fingerprint is None:
+            with self._lock:
+                if self._by_fingerprint is None:
+                    self._by_fingerprint = self._load()
+                by_fingerprint = self._by_fingerprint
+        try:
+            return by_fingerprint.get(int(fingerprint_id))
+        except (TypeError, ValueError):
+            return None
+
+
+student_cache = StudentCache()
@@ -0,0 +1,151 @@
+import calendar
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+
+from cache_sync import SharedGeneration
+
+MINUTES_PER_DAY = 24 * 60
+
+# Lightweight copy of a Timetable row. It is detached from any SQLAlchemy
+# session so it can be shared between requests safely.
+TimetableSlot = namedtuple('TimetableSlot', [
+    'id', 'day', 'start_time', 'end_time', 'subject', 'lab_name', 'semester',
+    'start_minute', 'end_minute'
+])
+
+
+def parse_hhmm(value):
+    """Converts an 'HH:MM' string into minutes since midnight (None if invalid)."""
+    try:
+        hours, minutes = value.strip().split(':')[:2]
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def minute_of_week(moment):
+    """Minutes elapsed since Monday 00:00 for the given datetime."""
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+class _Bucket:
+    """Sorted intervals for one (day, semester) pair.
+
+    `running_max_end[i]` is the latest end among slots[0..i], which lets a
+    lookup stop walking backwards as soon as no earlier slot can still be open.
+    """
+
+    def __init__(self, slots):
+        self.slots = sorted(slots, key=lambda s: (s.start_minute, s.id))
+        self.starts = [s.start_minute for s in self.slots]
+        self.running_max_end = []
+        latest = -1
+        for slot in self.slots:
+            latest = max(latest, slot.end_minute)
+            self.running_max_end.append(latest)
+
+    def at(self, minute):
+        """All slots with start <= minute <= end, ordered by id."""
+        i = bisect_right(self.starts, minute) - 1
+        found = []
+        while i >= 0 and self.running_max_end[i] >= minute:
+            if self.slots[i].end_minute >= minute:
+                found.append(self.slots[i])
+            i -= 1
+        found.sort(key=lambda s: s.id)
+        return found
+
+
+class TimetableIndex:
+    """In-memory index of the timetable, rebuilt lazily after invalidate().
+
+    Entries are keyed by minute-of-week and bucketed per (day, semester), so
+    "which class is running now" is a bisect instead of a database query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = None
+        self.generation = SharedGeneration('cache_generation:timetable')
+
+    def invalidate(self):
+        """Drops the compiled index (in every worker). The next lookup reloads it from the DB."""
+        self._drop()
+        self.generation.bump()
+
+    def _drop(self):
+        with self._lock:
+            self._buckets = None
+
+    def build(self, entries):
+        """Compiles Timetable rows (or anything with the same attributes)."""
+        grouped = {}
+        for entry in entries:
+            start = parse_hhmm(entry.start_time)
+            end = parse_hhmm(entry.end_time)
+            if entry.day not in calendar.day_name or start is None or end is None:
+                continue  # Unparseable rows can never match a HH:MM lookup
+            day_index = list(calendar.day_name).index(entry.day)
+            offset = day_index * MINUTES_PER_DAY
+            slot = TimetableSlot(
+                entry.id, entry.day, entry.start_time, entry.end_time,
+                entry.subject, entry.lab_name, str(entry.semester),
+                offset + start, offset + end
+            )
+            grouped.setdefault((day_index, slot.semester), []).append(slot)
+
+        return {key: _Bucket(slots) for key, slots in grouped.items()}
+
+    def _get_buckets(self):
+        if self.generation.changed():
+            self._drop()
+        buckets = self._buckets
+        if buckets is None:
+            from database import Timetable
+            with self._lock:
+                if self._buckets is None:
+                    self._buckets = self.build(Timetable.query.all())
+                buckets = self._buckets
+        return buckets
+
+    def current_class(self, semester, now, lab_name=None):
+        """First class (by id) running for `semester` at `now`, or None.
+
+        With `lab_name`, only classes held in that lab (case-insensitive) count.
+        """
+        minute = minute_of_week(now)
+        bucket = self._get_buckets().get((now.weekday(), str(semester)))
+        if bucket is None:
+            return None
+        found = bucket.at(minute)
+        if lab_name:
+            lab = lab_name.strip().lower()
+            found = [slot for slot in found if (slot.lab_name or '').strip().lower() == lab]
+        return found[0] if found else None
+
+    def slots(self, semester=None):
+        """Every parsed slot (optionally for one semester), ordered by id."""
+        found = []
+        for (_day, slot_semester), bucket in self._get_buckets().items():
+            if semester is None or slot_semester == str(semester):
+                found.extend(bucket.slots)
+        found.sort(key=lambda s: s.id)
+        return found
+
+    def current_classes(self, now):
+        """All classes running at `now` across every semester, ordered by id."""
+        minute = minute_of_week(now)
+        day_index = now.weekday()
+        found = []
+        for (day, _semester), bucket in self._get_buckets().items():
+            if day == day_index:
+                found.extend(bucket.at(minute))
+        found.sort(key=lambda s: s.id)
+        return found
+
+
+timetable_index = TimetableIndex()